@@ -5,20 +5,35 @@
 import os
 import json
 import requests
+from requests.adapters import HTTPAdapter
 import datetime
 import csv
 from io import StringIO
 import base64
 from email.mime.text import MIMEText
+from email.utils import parsedate_to_datetime
 import pickle
+import codecs
+import hashlib
+import bisect
+import zlib
 from googleapiclient.discovery import build
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 import PyPDF2
 import tempfile
 import re
+import math
 import functools
-from flask import Flask, request, jsonify, send_file, send_from_directory
+import copy
+import time
+import random
+import threading
+from collections import namedtuple, OrderedDict
+from collections.abc import Mapping, MutableMapping
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import Flask, request, jsonify, send_file, send_from_directory, after_this_request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import traceback
@@ -42,8 +57,13 @@ client = OpenAI(api_key=OPENAI_API_KEY)
 # Replace them with these lines:
 PEOPLE_DATA_LABS_API_KEY = os.getenv('PEOPLE_DATA_LABS_API_KEY')
 
+# Several keys (comma-separated) are load-balanced by the PDL client; falls back to the single key
+PEOPLE_DATA_LABS_API_KEYS = [key.strip() for key in os.getenv('PEOPLE_DATA_LABS_API_KEYS', '').split(',') if key.strip()]
+if not PEOPLE_DATA_LABS_API_KEYS and PEOPLE_DATA_LABS_API_KEY:
+    PEOPLE_DATA_LABS_API_KEYS = [PEOPLE_DATA_LABS_API_KEY]
+
 # Add this validation
-if not PEOPLE_DATA_LABS_API_KEY:
+if not PEOPLE_DATA_LABS_API_KEYS:
     print("WARNING: PEOPLE_DATA_LABS_API_KEY not found in .env file")
 
 if not OPENAI_API_KEY:
@@ -99,8 +119,18 @@ def require_firebase_auth(fn):
             return jsonify({'error': f'Invalid token: {str(e)}'}), 401
     return wrapper
 
+class MappingJSONProvider(DefaultJSONProvider):
+    """Flask JSON that also serializes Mapping types such as Contact and ContactView"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Mapping):
+            return dict(o)
+        return DefaultJSONProvider.default(o)
+
 # Initialize Flask app
 app = Flask(__name__)
+app.json = MappingJSONProvider(app)
 CORS(app, origins=["https://d33d83bb2e38.ngrok-free.app", "*"])
 
 DB_PATH = os.path.join(os.path.dirname(__file__), 'contacts.db')
@@ -147,6 +177,30 @@ def init_db():
         """)
         db.execute("CREATE INDEX IF NOT EXISTS idx_contacts_user_email ON contacts(user_email);")
         db.execute("CREATE INDEX IF NOT EXISTS idx_contacts_linkedin ON contacts(linkedin);")
+        db.execute("""
+        CREATE TABLE IF NOT EXISTS search_outcomes (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          location_key TEXT NOT NULL,
+          company_key TEXT NOT NULL,
+          title_level TEXT NOT NULL,
+          strategy TEXT NOT NULL,
+          requested INTEGER NOT NULL,
+          contacts INTEGER NOT NULL,
+          with_email INTEGER NOT NULL,
+          latency_ms INTEGER,
+          created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS idx_search_outcomes_key ON search_outcomes(location_key, company_key, title_level, created_at);")
+        db.execute("""
+        CREATE TABLE IF NOT EXISTS user_seen_people (
+          user_email TEXT NOT NULL,
+          key_type TEXT NOT NULL,
+          key_value TEXT NOT NULL,
+          seen_at TEXT DEFAULT CURRENT_TIMESTAMP,
+          PRIMARY KEY (user_email, key_type, key_value)
+        );
+        """)
         db.commit()
 
 def normalize_contact(c: dict) -> dict:
@@ -216,6 +270,108 @@ def list_contacts_sqlite(user_email: str) -> list:
         """, (user_email,)).fetchall()
         return [dict(r) for r in rows]
 
+# Cap on people excluded from one PDL query, to keep the query small enough for PDL to run quickly
+PDL_EXCLUSION_MAX_PEOPLE = int(os.getenv('PDL_EXCLUSION_MAX_PEOPLE', '100'))
+
+SearchExclusions = namedtuple('SearchExclusions', ['linkedin_urls', 'emails'])
+
+def normalize_linkedin_url(url):
+    """'https://www.linkedin.com/in/Jane-Doe/' -> 'linkedin.com/in/jane-doe', PDL's linkedin_url form"""
+    url = re.sub(r'^https?://', '', str(url or '').strip().lower())
+    url = re.sub(r'^[a-z]{2,3}\.(?=linkedin\.com)', '', url)
+    url = url.split('?')[0].rstrip('/')
+    return url if url.startswith('linkedin.com/in/') else ''
+
+def normalize_email(email):
+    email = str(email or '').strip().lower()
+    return email if '@' in email else ''
+
+def record_seen_people(user_email, contacts):
+    """Remember who a user has already been shown so later searches can skip them"""
+    if not user_email or not contacts:
+        return
+    rows = []
+    for c in contacts:
+        linkedin = normalize_linkedin_url(c.get('LinkedIn'))
+        if linkedin:
+            rows.append((user_email, 'linkedin', linkedin))
+        for field in ('Email', 'PersonalEmail', 'WorkEmail'):
+            email = normalize_email(c.get(field))
+            if email:
+                rows.append((user_email, 'email', email))
+    try:
+        with get_db() as db:
+            db.executemany("""
+              INSERT INTO user_seen_people (user_email, key_type, key_value) VALUES (?,?,?)
+              ON CONFLICT(user_email, key_type, key_value) DO UPDATE SET seen_at = CURRENT_TIMESTAMP
+            """, rows)
+            db.commit()
+    except Exception as e:
+        print(f"Failed to record seen people: {e}")
+
+def record_seen_people_after_delivery(user_email, contacts):
+    """Call record_seen_people once the current request's response has been sent
+    
+    Nothing is recorded if the response is an error, so a failure after the search
+    (drafts, CSV, saving) never hides people from a user who never received them.
+    """
+    @after_this_request
+    def record_on_close(response):
+        if response.status_code < 400:
+            response.call_on_close(lambda: record_seen_people(user_email, contacts))
+        return response
+
+def load_search_exclusions(user_email, max_people=PDL_EXCLUSION_MAX_PEOPLE):
+    """People a user already has (directory + previous runs), most recent first, as SearchExclusions"""
+    if not user_email:
+        return None
+    linkedin_urls, emails = [], []
+    try:
+        with get_db() as db:
+            seen = db.execute("""
+              SELECT key_type, key_value FROM user_seen_people WHERE user_email=? ORDER BY seen_at DESC
+            """, (user_email,)).fetchall()
+        for row in seen:
+            (linkedin_urls if row['key_type'] == 'linkedin' else emails).append(row['key_value'])
+    except Exception as e:
+        print(f"Failed to load seen people: {e}")
+    try:
+        for c in list_contacts_sqlite(user_email):
+            linkedin_urls.append(normalize_linkedin_url(c.get('linkedin')))
+            emails.extend(normalize_email(c.get(field)) for field in ('email', 'personal_email', 'work_email'))
+    except Exception as e:
+        print(f"Failed to load directory contacts for exclusion: {e}")
+    
+    # Newest first, at most max_people of each kind
+    linkedin_urls = [url for url in dict.fromkeys(linkedin_urls) if url][:max_people]
+    emails = [email for email in dict.fromkeys(emails) if email][:max_people]
+    if not linkedin_urls and not emails:
+        return None
+    print(f"Excluding {len(linkedin_urls)} LinkedIn profiles and {len(emails)} emails already seen by {user_email}")
+    return SearchExclusions(frozenset(linkedin_urls), frozenset(emails))
+
+def apply_search_exclusions(elasticsearch_query, exclusions):
+    """Add must_not clauses so PDL skips people in exclusions; returns the query"""
+    if exclusions:
+        must_not = elasticsearch_query['query']['bool'].setdefault('must_not', [])
+        if exclusions.linkedin_urls:
+            must_not.append({"terms": {"linkedin_url": sorted(exclusions.linkedin_urls)}})
+        if exclusions.emails:
+            must_not.append({"terms": {"emails.address": sorted(exclusions.emails)}})
+    return elasticsearch_query
+
+def person_is_excluded(person, exclusions):
+    """Whether a raw PDL person record is one of the excluded people"""
+    if not exclusions:
+        return False
+    linkedin_urls = [person.get('linkedin_url')]
+    linkedin_urls += [p.get('url') for p in person.get('profiles') or [] if isinstance(p, dict)]
+    if any(normalize_linkedin_url(url) in exclusions.linkedin_urls for url in linkedin_urls if url):
+        return True
+    emails = [person.get('recommended_personal_email')]
+    emails += [e.get('address') for e in person.get('emails') or [] if isinstance(e, dict)]
+    return any(normalize_email(email) in exclusions.emails for email in emails if email)
+
 # PDL Configuration with your API key
 PDL_BASE_URL = 'https://api.peopledatalabs.com/v5'
 
@@ -245,6 +401,147 @@ TIER_CONFIGS = {
     }
 }
 
+# PDL person fields each contact field is built from; a tier's field list is pushed
+# down to PDL as data_include so responses only carry what the tier returns
+CONTACT_FIELD_PDL_SOURCES = {
+    'FirstName': ['first_name'],
+    'LastName': ['last_name'],
+    'LinkedIn': ['profiles'],
+    'Email': ['recommended_personal_email', 'emails'],
+    'Title': ['experience'],
+    'Company': ['experience'],
+    'City': ['location_locality'],
+    'State': ['location_region'],
+    'College': ['education'],
+    'Phone': ['phone_numbers'],
+    'PersonalEmail': ['recommended_personal_email', 'emails'],
+    'WorkEmail': ['emails'],
+    'SocialProfiles': ['profiles'],
+    'EducationTop': ['education'],
+    'VolunteerHistory': ['interests', 'summary'],
+    'WorkSummary': ['experience'],
+    'Group': ['experience'],
+    'LinkedInConnections': ['linkedin_connections'],
+    'DataVersion': ['dataset_version'],
+}
+
+# Every contact key the pipeline produces, in output order; each is a slot on Contact
+CONTACT_FIELDS = (
+    'FirstName', 'LastName', 'LinkedIn', 'Email', 'Title', 'Company', 'City', 'State', 'College',
+    'Phone', 'PersonalEmail', 'WorkEmail', 'SocialProfiles', 'EducationTop', 'VolunteerHistory',
+    'WorkSummary', 'Group', 'LinkedInConnections', 'DataVersion', 'PdlId',
+    'Hometown', 'Similarity', 'email_subject', 'email_body', 'draft_id'
+)
+_CONTACT_FIELD_SET = frozenset(CONTACT_FIELDS)
+_MISSING = object()
+
+class Contact(MutableMapping):
+    """One contact, stored in slots instead of a per-contact dict.
+    
+    Behaves like the dict it replaces (contact['Email'], .get, iteration in field
+    order, ==, json/csv), so existing code keeps working. Keys outside CONTACT_FIELDS
+    go into a small overflow dict that is only created when needed.
+    """
+
+    __slots__ = CONTACT_FIELDS + ('_extra',)
+
+    def __init__(self, items=(), **kwargs):
+        self._extra = None
+        self.update(items, **kwargs)
+
+    def __getitem__(self, key):
+        if key in _CONTACT_FIELD_SET:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in _CONTACT_FIELD_SET:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _CONTACT_FIELD_SET:
+            if getattr(self, key, _MISSING) is _MISSING:
+                raise KeyError(key)
+            delattr(self, key)
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in _CONTACT_FIELD_SET:
+            return getattr(self, key, _MISSING) is not _MISSING
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for key in CONTACT_FIELDS:
+            if getattr(self, key, _MISSING) is not _MISSING:
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __reduce__(self):
+        return (Contact, (list(self.items()),))
+
+    def __repr__(self):
+        return f"Contact({dict(self)!r})"
+
+class ContactView(Mapping):
+    """Read-only projection of a Contact onto a fixed key tuple (e.g. a tier's output fields).
+    
+    Keys in defaults are always present, falling back to the default when the contact lacks them.
+    """
+
+    __slots__ = ('_contact', '_keys', '_defaults')
+
+    def __init__(self, contact, keys, defaults=None):
+        self._contact = contact
+        self._keys = keys
+        self._defaults = defaults or {}
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        if key in self._contact:
+            return self._contact[key]
+        return self._defaults[key]
+
+    def __iter__(self):
+        return (key for key in self._keys if key in self._contact or key in self._defaults)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"ContactView({dict(self)!r})"
+
+# Keys each tier returns per contact, computed once instead of per contact
+TIER_OUTPUT_KEYS = {tier: tuple(config['fields']) + ('email_subject', 'email_body') for tier, config in TIER_CONFIGS.items()}
+TIER_OUTPUT_DEFAULTS = {'email_subject': '', 'email_body': ''}
+
+# Always requested so stored person records can be indexed and matched locally
+PDL_PERSON_INDEX_FIELDS = ['job_title', 'job_company_name', 'location_metro', 'location_locality', 'location_region', 'linkedin_url']
+
+def pdl_data_include_for_fields(fields):
+    """Comma-separated PDL data_include for a contact field list, or None for full records"""
+    if not fields:
+        return None
+    pdl_fields = {'id', 'first_name', 'last_name', *PDL_PERSON_INDEX_FIELDS}
+    for field in fields:
+        pdl_fields.update(CONTACT_FIELD_PDL_SOURCES.get(field, []))
+    return ','.join(sorted(pdl_fields))
+
 # PDL Major Metro Areas (based on PDL documentation)
 PDL_METRO_AREAS = {
     'san francisco': 'san francisco, california',
@@ -301,79 +598,1310 @@ PDL_METRO_AREAS = {
     'providence': 'providence, rhode island'
 }
 
+# ========================================
+# PDL RATE LIMITING (token buckets shared across workers and nodes)
+# ========================================
+
+PDL_RATE_LIMIT_DB_PATH = os.getenv('PDL_RATE_LIMIT_DB_PATH', os.getenv('PDL_CACHE_PATH', os.path.join(os.path.dirname(__file__), 'pdl_cache.db')))
+RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL')
+PDL_RATE_LIMIT_BURST_SECONDS = float(os.getenv('PDL_RATE_LIMIT_BURST_SECONDS', '5'))
+
+# Calls per minute allowed for the whole deployment, and how long a caller may queue for a slot
+PDL_RATE_LIMITS = {
+    'search': {
+        'per_minute': float(os.getenv('PDL_SEARCH_RATE_PER_MINUTE', '60')),
+        'max_wait': float(os.getenv('PDL_SEARCH_RATE_MAX_WAIT_SECONDS', '10'))
+    },
+    'enrich': {
+        'per_minute': float(os.getenv('PDL_ENRICH_RATE_PER_MINUTE', '120')),
+        'max_wait': float(os.getenv('PDL_ENRICH_RATE_MAX_WAIT_SECONDS', '3'))
+    },
+    'clean': {
+        'per_minute': float(os.getenv('PDL_CLEAN_RATE_PER_MINUTE', '120')),
+        'max_wait': float(os.getenv('PDL_CLEAN_RATE_MAX_WAIT_SECONDS', '2'))
+    },
+    'autocomplete': {
+        'per_minute': float(os.getenv('PDL_AUTOCOMPLETE_RATE_PER_MINUTE', '300')),
+        'max_wait': float(os.getenv('PDL_AUTOCOMPLETE_RATE_MAX_WAIT_SECONDS', '0.5'))
+    }
+}
+
+PDL_ENDPOINT_CLASSES = {
+    '/person/search': 'search',
+    '/job_title/enrich': 'enrich',
+    '/company/clean': 'clean',
+    '/location/clean': 'clean',
+    '/autocomplete': 'autocomplete'
+}
+
+class PDLRateLimitError(Exception):
+    """No PDL capacity for an endpoint class right now; retry_after is whole seconds until there should be"""
+
+    def __init__(self, endpoint_class, retry_after):
+        self.endpoint_class = endpoint_class
+        self.retry_after = max(1, int(math.ceil(retry_after or 0)))
+        super().__init__(f"PDL {endpoint_class} rate limit reached, retry in {self.retry_after}s")
+
+class TokenBucketRateLimiter:
+    """One token bucket per PDL endpoint class, stored where every worker can see it.
+    
+    With RATE_LIMIT_REDIS_URL the buckets live in Redis and are updated by a Lua script on
+    the Redis clock, so all nodes sharing the API key share one budget. Otherwise they live
+    in SQLite next to the PDL cache, shared by the processes on this box.
+    
+    A caller reserves a slot and sleeps until it comes up (tokens may go negative, which
+    queues later callers behind it), or fails fast with PDLRateLimitError when the wait
+    would exceed the class's max_wait. If the store itself is unreachable calls are let
+    through; PDL's own 429s and the client's backoff still apply.
+    """
+
+    REDIS_TAKE_SCRIPT = """
+    local now_parts = redis.call('TIME')
+    local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+    local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local max_wait, drain = tonumber(ARGV[3]), tonumber(ARGV[4])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+    local tokens = burst
+    if state[1] then
+      tokens = math.min(burst, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * rate)
+    end
+    local granted, wait = 1, 0
+    if drain > 0 then
+      tokens = math.min(tokens, -drain * rate)
+    elseif tokens < 1 then
+      wait = (1 - tokens) / rate
+      if wait > max_wait then granted = 0 else tokens = tokens - 1 end
+    else
+      tokens = tokens - 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate + drain) + 60)
+    return {granted, tostring(wait)}
+    """
+
+    def __init__(self, limits, db_path, redis_url=None, burst_seconds=PDL_RATE_LIMIT_BURST_SECONDS):
+        self.limits = limits
+        self.db_path = db_path
+        self.burst_seconds = burst_seconds
+        self._local = threading.local()
+        self._schema_ready = False
+        self._redis_take = None
+        if redis_url:
+            try:
+                import redis
+                self._redis_take = redis.Redis.from_url(redis_url, socket_timeout=1).register_script(self.REDIS_TAKE_SCRIPT)
+                print("PDL rate limiter: using Redis buckets")
+            except Exception as e:
+                print(f"PDL rate limiter: Redis unavailable ({e}), using SQLite buckets")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        if not self._schema_ready:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS pdl_rate_limits (
+              bucket TEXT PRIMARY KEY,
+              tokens REAL NOT NULL,
+              updated_at REAL NOT NULL
+            );
+            """)
+            self._schema_ready = True
+        return conn
+
+    def _bucket(self, endpoint_class, key_id=None):
+        rate = self.limits[endpoint_class]['per_minute'] / 60.0
+        name = f"pdl:{key_id}:{endpoint_class}" if key_id else f"pdl:{endpoint_class}"
+        return name, rate, max(1.0, rate * self.burst_seconds)
+
+    @staticmethod
+    def _settle(tokens, now, updated_at, rate, burst, max_wait, drain):
+        """Same arithmetic as REDIS_TAKE_SCRIPT: returns (tokens, granted, wait)"""
+        tokens = burst if tokens is None else min(burst, tokens + max(0.0, now - updated_at) * rate)
+        if drain > 0:
+            return min(tokens, -drain * rate), True, 0.0
+        if tokens >= 1:
+            return tokens - 1, True, 0.0
+        wait = (1 - tokens) / rate
+        if wait > max_wait:
+            return tokens, False, wait
+        return tokens - 1, True, wait
+
+    def _take_sqlite(self, bucket, rate, burst, max_wait, drain):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated_at FROM pdl_rate_limits WHERE bucket = ?", (bucket,)).fetchone()
+            tokens, granted, wait = self._settle(row[0] if row else None, now, row[1] if row else now,
+                                                 rate, burst, max_wait, drain)
+            conn.execute("""
+              INSERT INTO pdl_rate_limits (bucket, tokens, updated_at) VALUES (?,?,?)
+              ON CONFLICT(bucket) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at
+            """, (bucket, tokens, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return granted, wait
+
+    def _take(self, endpoint_class, key_id=None, max_wait=0.0, drain=0.0):
+        bucket, rate, burst = self._bucket(endpoint_class, key_id)
+        try:
+            if self._redis_take is not None:
+                granted, wait = self._redis_take(keys=[bucket], args=[rate, burst, max_wait, drain])
+                return bool(int(granted)), float(wait)
+            return self._take_sqlite(bucket, rate, burst, max_wait, drain)
+        except Exception as e:
+            print(f"PDL rate limiter store error, letting call through: {e}")
+            return True, 0.0
+
+    def acquire(self, endpoint_class, key_id=None, max_wait=None):
+        """Wait for this call's slot, or raise PDLRateLimitError if it is further away than max_wait
+        
+        key_id gives each API key its own buckets, since PDL limits every key separately.
+        """
+        if endpoint_class not in self.limits:
+            return
+        if max_wait is None:
+            max_wait = self.limits[endpoint_class]['max_wait']
+        granted, wait = self._take(endpoint_class, key_id, max_wait=max_wait)
+        if not granted:
+            raise PDLRateLimitError(endpoint_class, wait)
+        if wait > 0:
+            print(f"PDL {endpoint_class} rate limit: waiting {wait:.2f}s for a slot")
+            time.sleep(wait)
+
+    def backoff(self, endpoint_class, seconds, key_id=None):
+        """PDL answered 429: hold every worker sharing the bucket off for seconds"""
+        if endpoint_class in self.limits and seconds > 0:
+            self._take(endpoint_class, key_id, drain=seconds)
+
+pdl_rate_limiter = TokenBucketRateLimiter(PDL_RATE_LIMITS, PDL_RATE_LIMIT_DB_PATH, RATE_LIMIT_REDIS_URL)
+
+# ========================================
+# PDL API KEY POOL
+# ========================================
+
+PDL_KEY_RATE_LIMIT_COOLDOWN_SECONDS = float(os.getenv('PDL_KEY_RATE_LIMIT_COOLDOWN_SECONDS', '10'))
+PDL_KEY_PAYMENT_COOLDOWN_SECONDS = float(os.getenv('PDL_KEY_PAYMENT_COOLDOWN_SECONDS', '3600'))
+PDL_KEY_COOLDOWN_STATUSES = {402, 429}
+
+class PDLKey:
+    """One API key plus what we have learned about it in this process"""
+
+    LATENCY_ALPHA = 0.2
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        # Identifies the key in rate-limit buckets and stats without exposing it
+        self.key_id = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+        self.label = f"...{api_key[-4:]}" if len(api_key) > 8 else '...'
+        self.remaining = None
+        self.latency = None
+        self.cooldown_until = 0.0
+        self.in_flight = 0
+        self.counters = {'requests': 0, 'ok': 0, 'errors': 0, 'rate_limited': 0, 'payment_required': 0}
+
+    def observe_latency(self, seconds):
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += self.LATENCY_ALPHA * (seconds - self.latency)
+
+class PDLKeyPool:
+    """Spreads PDL calls over several API keys, each with its own rate limit and credits.
+    
+    Keys are ranked by the remaining quota PDL reports in response headers, their
+    recent latency and how many calls they already have in flight. A key that gets
+    a 402 (out of credits) or 429 is taken out of rotation for a cooldown window;
+    if every key is cooling down, the one that recovers first is used anyway.
+    """
+
+    QUOTA_HEADERS = ('X-RateLimit-Remaining', 'X-TotalLimit-Remaining')
+    DEFAULT_LATENCY = 1.0
+
+    def __init__(self, api_keys):
+        self.keys = [PDLKey(key) for key in dict.fromkeys(api_keys)] or [PDLKey('')]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _score(self, key):
+        quota = 1.0 if key.remaining is None else min(max(key.remaining, 0), 100) / 100.0
+        return quota / ((key.latency or self.DEFAULT_LATENCY) * (1 + key.in_flight))
+
+    def candidates(self):
+        """Keys in the order they should be tried: available ones best-first, then cooling ones soonest-first"""
+        now = time.time()
+        with self._lock:
+            keys = list(self.keys)
+            random.shuffle(keys)  # spread equally good keys
+            available = sorted((k for k in keys if k.cooldown_until <= now), key=self._score, reverse=True)
+            cooling = sorted((k for k in keys if k.cooldown_until > now), key=lambda k: k.cooldown_until)
+        return available + cooling
+
+    def has_available(self, exclude=None):
+        now = time.time()
+        return any(k.cooldown_until <= now and k is not exclude for k in self.keys)
+
+    def begin(self, key):
+        with self._lock:
+            key.in_flight += 1
+            key.counters['requests'] += 1
+
+    def finish(self, key, response, elapsed, retry_after=None):
+        """Record the outcome of one call made with key (response is None if it raised)"""
+        with self._lock:
+            key.in_flight -= 1
+            if response is None:
+                key.counters['errors'] += 1
+                return
+            key.observe_latency(elapsed)
+            remaining = self._remaining(response.headers)
+            if remaining is not None:
+                key.remaining = remaining
+            status = response.status_code
+            if status == 429:
+                key.counters['rate_limited'] += 1
+                cooldown = retry_after if retry_after is not None else PDL_KEY_RATE_LIMIT_COOLDOWN_SECONDS
+                key.cooldown_until = time.time() + cooldown
+            elif status == 402:
+                key.counters['payment_required'] += 1
+                key.cooldown_until = time.time() + PDL_KEY_PAYMENT_COOLDOWN_SECONDS
+            elif status >= 500:
+                key.counters['errors'] += 1
+            else:
+                key.counters['ok'] += 1
+
+    @classmethod
+    def _remaining(cls, headers):
+        """Smallest remaining-quota figure in PDL's headers (plain numbers or {"minute": n} style JSON)"""
+        values = []
+        for header in cls.QUOTA_HEADERS:
+            raw = headers.get(header)
+            if raw is None:
+                continue
+            try:
+                parsed = json.loads(raw)
+            except (TypeError, ValueError):
+                continue
+            if isinstance(parsed, dict):
+                values.extend(v for v in parsed.values() if isinstance(v, (int, float)))
+            elif isinstance(parsed, (int, float)):
+                values.append(parsed)
+        return min(values) if values else None
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return [dict(key.counters,
+                         key=key.label,
+                         in_flight=key.in_flight,
+                         remaining=key.remaining,
+                         latency_ms=round(key.latency * 1000) if key.latency is not None else None,
+                         cooldown_seconds=max(0, round(key.cooldown_until - now)))
+                    for key in self.keys]
+
+pdl_key_pool = PDLKeyPool(PEOPLE_DATA_LABS_API_KEYS)
+
+# ========================================
+# PDL HTTP CLIENT (pooled connections + retries)
+# ========================================
+
+PDL_CONNECT_TIMEOUT = float(os.getenv('PDL_CONNECT_TIMEOUT', '3.05'))
+PDL_READ_TIMEOUT = float(os.getenv('PDL_READ_TIMEOUT', '10'))
+PDL_SEARCH_READ_TIMEOUT = float(os.getenv('PDL_SEARCH_READ_TIMEOUT', '15'))
+PDL_POOL_SIZE = int(os.getenv('PDL_POOL_SIZE', '20'))
+PDL_MAX_RETRIES = int(os.getenv('PDL_MAX_RETRIES', '3'))
+PDL_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class PDLClient:
+    """Single keep-alive HTTP client for every PDL call.
+    
+    Reuses pooled TLS connections through one requests.Session, applies the same
+    connect/read timeouts everywhere, and retries 429/5xx responses and failed connects
+    with exponential backoff and full jitter, honoring Retry-After when PDL sends it.
+    Read timeouts are not retried because PDL may already have billed the request.
+    
+    Every attempt picks a key from the key pool and takes a slot from that key's shared
+    rate-limit bucket. A 402/429 on one key moves the call straight to another key when
+    one is in rotation. A 429 that survives the retries (or asks for a longer wait than
+    max_retry_after) raises PDLRateLimitError instead of returning the response, so
+    callers can report it rather than "no results".
+    """
+
+    def __init__(self, base_url, key_pool, pool_size=PDL_POOL_SIZE, max_retries=PDL_MAX_RETRIES,
+                 backoff_base=0.5, backoff_cap=8.0, max_retry_after=30.0, rate_limiter=None):
+        self.base_url = base_url.rstrip('/')
+        self.key_pool = key_pool
+        # Recent response time (EWMA seconds, until headers arrive) per endpoint class
+        self.latency = {}
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_retry_after = max_retry_after
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0, pool_block=False)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after(self, response):
+        """Seconds requested by a Retry-After header, or None if absent/unparseable"""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+        except Exception:
+            return None
+
+    def _observe_latency(self, endpoint_class, seconds):
+        previous = self.latency.get(endpoint_class)
+        self.latency[endpoint_class] = seconds if previous is None else previous + PDLKey.LATENCY_ALPHA * (seconds - previous)
+
+    def _checkout_key(self, endpoint_class):
+        """Best key that has a rate-limit slot, preferring one with a slot free right now"""
+        candidates = self.key_pool.candidates()
+        if self.rate_limiter is None or not endpoint_class:
+            return candidates[0]
+        if len(candidates) > 1:
+            now = time.time()
+            for key in candidates:
+                if key.cooldown_until > now:
+                    break
+                try:
+                    self.rate_limiter.acquire(endpoint_class, key.key_id, max_wait=0)
+                    return key
+                except PDLRateLimitError:
+                    continue
+        self.rate_limiter.acquire(endpoint_class, candidates[0].key_id)
+        return candidates[0]
+
+    def get(self, path, params=None, **kwargs):
+        """GET {base_url}{path} with an API key from the pool attached; returns the final requests.Response"""
+        return self.request('GET', path, params=params, **kwargs)
+
+    def post(self, path, json=None, **kwargs):
+        """POST a JSON body to {base_url}{path}; used where a GET query string would grow too long"""
+        return self.request('POST', path, json=json, **kwargs)
+
+    def request(self, method, path, params=None, timeout=None, max_retries=None, **kwargs):
+        url = f"{self.base_url}{path}"
+        retries = self.max_retries if max_retries is None else max_retries
+        timeout = timeout or (PDL_CONNECT_TIMEOUT, PDL_READ_TIMEOUT)
+        endpoint_class = PDL_ENDPOINT_CLASSES.get(path)
+        
+        attempt = 0
+        key_switches = 0
+        while True:
+            key = self._checkout_key(endpoint_class)
+            self.key_pool.begin(key)
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, params=params, headers={'X-Api-Key': key.api_key},
+                                                timeout=timeout, **kwargs)
+            except Exception as e:
+                self.key_pool.finish(key, None, time.monotonic() - started)
+                if not isinstance(e, requests.exceptions.ConnectionError) or attempt >= retries:
+                    raise
+                delay = self._backoff(attempt)
+                print(f"PDL {path} connection failed ({e}), retrying in {delay:.2f}s")
+            else:
+                elapsed = time.monotonic() - started
+                retry_after = self._retry_after(response) if response.status_code in PDL_RETRY_STATUSES else None
+                self.key_pool.finish(key, response, elapsed, retry_after)
+                self._observe_latency(endpoint_class or path, elapsed)
+                if (response.status_code in PDL_KEY_COOLDOWN_STATUSES and key_switches < len(self.key_pool) - 1
+                        and self.key_pool.has_available(exclude=key)):
+                    print(f"PDL {path} returned {response.status_code} for key {key.label}, switching keys")
+                    if response.status_code == 429 and self.rate_limiter is not None and endpoint_class:
+                        self.rate_limiter.backoff(endpoint_class, PDL_KEY_RATE_LIMIT_COOLDOWN_SECONDS if retry_after is None else retry_after,
+                                                 key.key_id)
+                    response.close()
+                    key_switches += 1
+                    continue
+                if response.status_code not in PDL_RETRY_STATUSES:
+                    return response
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                if response.status_code == 429:
+                    if self.rate_limiter is not None and endpoint_class:
+                        self.rate_limiter.backoff(endpoint_class, delay, key.key_id)
+                    if attempt >= retries or delay > self.max_retry_after:
+                        response.close()
+                        raise PDLRateLimitError(endpoint_class or path, delay)
+                elif attempt >= retries or (retry_after is not None and retry_after > self.max_retry_after):
+                    return response
+                print(f"PDL {path} returned {response.status_code}, retrying in {delay:.2f}s")
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+pdl_client = PDLClient(PDL_BASE_URL, pdl_key_pool, rate_limiter=pdl_rate_limiter)
+
+# ========================================
+# PDL RESPONSE CACHE (shared by all workers)
+# ========================================
+
+PDL_CACHE_PATH = os.getenv('PDL_CACHE_PATH', os.path.join(os.path.dirname(__file__), 'pdl_cache.db'))
+PDL_CACHE_MAX_ENTRIES = int(os.getenv('PDL_CACHE_MAX_ENTRIES', '20000'))
+CLEANER_CACHE_TTL_SECONDS = int(os.getenv('PDL_CLEANER_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+CLEANER_NEGATIVE_TTL_SECONDS = int(os.getenv('PDL_CLEANER_NEGATIVE_TTL_SECONDS', str(24 * 3600)))
+
+CacheEntry = namedtuple('CacheEntry', ['value', 'negative', 'fetched_at', 'expires_at'])
+
+class PDLCache:
+    """SQLite-backed TTL cache for PDL responses, shared by every worker process on the box.
+
+    Entries live in a namespace (e.g. 'company_clean'), expire individually, and each
+    namespace is trimmed least-recently-used once it grows past its entry limit.
+    Negative entries record that PDL answered but had nothing useful, so the same
+    input is not retried on every request. Cache failures are logged and treated as misses.
+    """
+
+    # Only refresh last_access when it is older than this, so hot keys don't turn every read into a write
+    TOUCH_INTERVAL_SECONDS = 60
+    EVICT_EVERY_N_WRITES = 100
+    STATS_FLUSH_INTERVAL_SECONDS = 30
+
+    def __init__(self, path, max_entries=PDL_CACHE_MAX_ENTRIES, namespace_limits=None, namespace_byte_limits=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.namespace_limits = namespace_limits or {}
+        self.namespace_byte_limits = namespace_byte_limits or {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._pending_stats = {}
+        self._last_stats_flush = time.time()
+        self._schema_ready = False
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._schema_ready:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS pdl_cache (
+              namespace TEXT NOT NULL,
+              cache_key TEXT NOT NULL,
+              value TEXT,
+              negative INTEGER DEFAULT 0,
+              size INTEGER DEFAULT 0,
+              fetched_at REAL NOT NULL,
+              expires_at REAL NOT NULL,
+              last_access REAL NOT NULL,
+              PRIMARY KEY (namespace, cache_key)
+            );
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_pdl_cache_lru ON pdl_cache(namespace, last_access);")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS pdl_cache_stats (
+              namespace TEXT NOT NULL,
+              stat TEXT NOT NULL,
+              count INTEGER DEFAULT 0,
+              PRIMARY KEY (namespace, stat)
+            );
+            """)
+            conn.commit()
+            self._schema_ready = True
+        return conn
+
+    def _count(self, namespace, stat):
+        with self._lock:
+            key = (namespace, stat)
+            self._pending_stats[key] = self._pending_stats.get(key, 0) + 1
+            due = time.time() - self._last_stats_flush >= self.STATS_FLUSH_INTERVAL_SECONDS
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self):
+        with self._lock:
+            pending, self._pending_stats = self._pending_stats, {}
+            self._last_stats_flush = time.time()
+        if not pending:
+            return
+        try:
+            conn = self._connect()
+            conn.executemany("""
+              INSERT INTO pdl_cache_stats (namespace, stat, count) VALUES (?,?,?)
+              ON CONFLICT(namespace, stat) DO UPDATE SET count = count + excluded.count
+            """, [(ns, stat, n) for (ns, stat), n in pending.items()])
+            conn.commit()
+        except Exception as e:
+            print(f"PDL cache stats flush failed: {e}")
+
+    def get(self, namespace, key):
+        """Return a live CacheEntry, or None on a miss or expired entry"""
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, negative, fetched_at, expires_at, last_access FROM pdl_cache WHERE namespace=? AND cache_key=?",
+                (namespace, key)
+            ).fetchone()
+            now = time.time()
+            if not row or row[3] <= now:
+                self._count(namespace, 'expired' if row else 'misses')
+                return None
+            if now - row[4] > self.TOUCH_INTERVAL_SECONDS:
+                conn.execute("UPDATE pdl_cache SET last_access=? WHERE namespace=? AND cache_key=?", (now, namespace, key))
+                conn.commit()
+            self._count(namespace, 'negative_hits' if row[1] else 'hits')
+            payload = row[0]
+            if isinstance(payload, bytes):
+                payload = zlib.decompress(payload)
+            value = json.loads(payload) if payload is not None else None
+            return CacheEntry(value, bool(row[1]), row[2], row[3])
+        except Exception as e:
+            print(f"PDL cache read failed ({namespace}): {e}")
+            return None
+
+    def set(self, namespace, key, value, ttl, negative=False):
+        """Store value as JSON"""
+        payload = json.dumps(value, separators=(',', ':')) if value is not None else None
+        self._write(namespace, key, payload, ttl, negative)
+
+    def set_negative(self, namespace, key, ttl):
+        self.set(namespace, key, None, ttl, negative=True)
+
+    def set_compressed(self, namespace, key, payload, ttl):
+        """Store an already zlib-compressed JSON payload (see CompressedJSONArrayWriter)"""
+        self._write(namespace, key, payload, ttl)
+
+    def _write(self, namespace, key, payload, ttl, negative=False):
+        """Store a JSON text or compressed bytes payload (get() tells them apart by type)"""
+        try:
+            conn = self._connect()
+            now = time.time()
+            conn.execute("""
+              INSERT OR REPLACE INTO pdl_cache (namespace, cache_key, value, negative, size, fetched_at, expires_at, last_access)
+              VALUES (?,?,?,?,?,?,?,?)
+            """, (namespace, key, payload, 1 if negative else 0, len(payload or ''), now, now + ttl, now))
+            conn.commit()
+            self._count(namespace, 'negative_sets' if negative else 'sets')
+            with self._lock:
+                self._writes += 1
+                evict_due = self._writes % self.EVICT_EVERY_N_WRITES == 0 or namespace in self.namespace_byte_limits
+            if evict_due:
+                self.evict(namespace)
+        except Exception as e:
+            print(f"PDL cache write failed ({namespace}): {e}")
+
+    def evict(self, namespace):
+        """Drop expired entries, then trim the namespace to its entry and byte limits by least-recent access"""
+        limit = self.namespace_limits.get(namespace, self.max_entries)
+        byte_limit = self.namespace_byte_limits.get(namespace)
+        try:
+            conn = self._connect()
+            conn.execute("DELETE FROM pdl_cache WHERE namespace=? AND expires_at<=?", (namespace, time.time()))
+            cur = conn.execute("""
+              DELETE FROM pdl_cache WHERE namespace=? AND cache_key IN (
+                SELECT cache_key FROM pdl_cache WHERE namespace=?
+                ORDER BY last_access DESC LIMIT -1 OFFSET ?
+              )
+            """, (namespace, namespace, limit))
+            evicted = max(cur.rowcount or 0, 0)
+            if byte_limit:
+                cur = conn.execute("""
+                  DELETE FROM pdl_cache WHERE namespace=? AND cache_key IN (
+                    SELECT cache_key FROM (
+                      SELECT cache_key, SUM(size) OVER (ORDER BY last_access DESC ROWS UNBOUNDED PRECEDING) AS running
+                      FROM pdl_cache WHERE namespace=?
+                    ) WHERE running > ?
+                  )
+                """, (namespace, namespace, byte_limit))
+                evicted += max(cur.rowcount or 0, 0)
+            conn.commit()
+            if evicted:
+                with self._lock:
+                    key = (namespace, 'evictions')
+                    self._pending_stats[key] = self._pending_stats.get(key, 0) + evicted
+        except Exception as e:
+            print(f"PDL cache eviction failed ({namespace}): {e}")
+
+    def stats(self):
+        """Hit/miss counters and entry counts per namespace, aggregated across workers"""
+        self.flush_stats()
+        result = {}
+        try:
+            conn = self._connect()
+            for namespace, stat, count in conn.execute("SELECT namespace, stat, count FROM pdl_cache_stats"):
+                result.setdefault(namespace, {})[stat] = count
+            for namespace, entries, size in conn.execute(
+                "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM pdl_cache GROUP BY namespace"
+            ):
+                result.setdefault(namespace, {}).update({'entries': entries, 'bytes': size})
+        except Exception as e:
+            print(f"PDL cache stats read failed: {e}")
+        for namespace, counters in result.items():
+            lookups = sum(counters.get(s, 0) for s in ('hits', 'negative_hits', 'misses', 'expired'))
+            served = counters.get('hits', 0) + counters.get('negative_hits', 0)
+            counters['hit_rate'] = round(served / lookups, 3) if lookups else 0.0
+        return result
+
+def normalize_cache_key(text):
+    """Case- and whitespace-insensitive cache key for free-text inputs"""
+    return ' '.join(str(text or '').lower().split())
+
+PDL_SEARCH_CACHE_TTL_SECONDS = int(os.getenv('PDL_SEARCH_CACHE_TTL_SECONDS', str(6 * 3600)))
+PDL_SEARCH_NEGATIVE_TTL_SECONDS = int(os.getenv('PDL_SEARCH_NEGATIVE_TTL_SECONDS', str(3600)))
+PDL_SEARCH_CACHE_MAX_BYTES = int(os.getenv('PDL_SEARCH_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+
+pdl_cache = PDLCache(PDL_CACHE_PATH, namespace_byte_limits={'person_search': PDL_SEARCH_CACHE_MAX_BYTES})
+
+def canonicalize_search_query(value):
+    """Recursively lowercase string values so equivalent queries serialize identically"""
+    if isinstance(value, dict):
+        return {k: canonicalize_search_query(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [canonicalize_search_query(v) for v in value]
+    if isinstance(value, str):
+        return ' '.join(value.lower().split())
+    return value
+
+def search_query_cache_key(elasticsearch_query, data_include=None):
+    """Stable hash of a canonical Elasticsearch query (sorted keys, normalized lowercase values)"""
+    canonical = json.dumps(canonicalize_search_query(elasticsearch_query), sort_keys=True, separators=(',', ':'))
+    if data_include:
+        canonical += '|' + data_include
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+# ========================================
+# PDL PERSON STORE (local warehouse of raw person records)
+# ========================================
+
+PDL_PERSON_STORE_ENABLED = os.getenv('PDL_PERSON_STORE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+PDL_PERSON_STORE_MAX_AGE_SECONDS = int(os.getenv('PDL_PERSON_STORE_MAX_AGE_SECONDS', str(30 * 24 * 3600)))
+PDL_PERSON_STORE_MAX_RECORDS = int(os.getenv('PDL_PERSON_STORE_MAX_RECORDS', '200000'))
+# People buffered from a streaming search page before they are written to the store; kept to
+# at most a quarter of a search page so a page's raw records are never all held at once
+PDL_PERSON_STORE_BATCH_SIZE = int(os.getenv('PDL_PERSON_STORE_BATCH_SIZE', '5'))
+
+def person_index_terms(person):
+    """(term_type, term) pairs a stored person can be found by"""
+    terms = set()
+    for token in re.findall(r'[a-z0-9]+', str(person.get('job_title') or '').lower()):
+        terms.add(('title', token))
+    for term_type, field in (('company', 'job_company_name'), ('metro', 'location_metro'),
+                             ('city', 'location_locality'), ('region', 'location_region')):
+        value = normalize_cache_key(person.get(field))
+        if value:
+            terms.add((term_type, value))
+    return terms
+
+def dataset_version_key(version):
+    """Sortable form of a PDL dataset_version such as '29.2'"""
+    return tuple(int(part) if part.isdigit() else part for part in re.split(r'[.\-]', str(version)))
+
+class PDLPersonStore:
+    """Raw PDL person records kept locally (zlib JSON), keyed by PDL id.
+
+    Each record is indexed by its title words, company, metro, city and region, so a
+    search can be answered - fully or partly - from people fetched by earlier searches.
+    Records older than PDL_PERSON_STORE_MAX_AGE_SECONDS, or from a dataset_version older
+    than the newest one PDL has returned, are not served. A record remembers which
+    data_include it was fetched with and only answers requests it has the fields for.
+    Store failures are logged and treated as empty results.
+    """
+
+    TRIM_EVERY_N_WRITES = 500
+
+    def __init__(self, path, max_age=PDL_PERSON_STORE_MAX_AGE_SECONDS, max_records=PDL_PERSON_STORE_MAX_RECORDS):
+        self.path = path
+        self.max_age = max_age
+        self.max_records = max_records
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._schema_ready = False
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._schema_ready:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS pdl_people (
+              id TEXT PRIMARY KEY,
+              dataset_version TEXT,
+              data_include TEXT,
+              fetched_at REAL NOT NULL,
+              payload BLOB NOT NULL
+            );
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_pdl_people_fetched ON pdl_people(fetched_at);")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS pdl_people_terms (
+              term_type TEXT NOT NULL,
+              term TEXT NOT NULL,
+              person_id TEXT NOT NULL,
+              PRIMARY KEY (term_type, term, person_id)
+            ) WITHOUT ROWID;
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_pdl_people_terms_person ON pdl_people_terms(person_id);")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS pdl_people_meta (
+              name TEXT PRIMARY KEY,
+              value TEXT
+            );
+            """)
+            conn.commit()
+            self._schema_ready = True
+        return conn
+
+    @staticmethod
+    def _covers(stored_include, wanted_include):
+        """Whether a record fetched with stored_include has every field of wanted_include (None = full record)"""
+        if stored_include is None:
+            return True
+        if wanted_include is None:
+            return False
+        return set(wanted_include.split(',')) <= set(stored_include.split(','))
+
+    def _latest_version(self, conn):
+        row = conn.execute("SELECT value FROM pdl_people_meta WHERE name = 'dataset_version'").fetchone()
+        return row[0] if row else None
+
+    def _note_version(self, conn, dataset_version):
+        latest = self._latest_version(conn)
+        if dataset_version and (latest is None or dataset_version_key(dataset_version) > dataset_version_key(latest)):
+            conn.execute("INSERT OR REPLACE INTO pdl_people_meta (name, value) VALUES ('dataset_version', ?)", (dataset_version,))
+
+    def set_dataset_version(self, ids, dataset_version):
+        """Stamp records stored before their page's dataset_version was known (it comes after the data)"""
+        if not ids or not dataset_version:
+            return
+        try:
+            conn = self._connect()
+            placeholders = ','.join('?' * len(ids))
+            conn.execute(f"UPDATE pdl_people SET dataset_version = ? WHERE dataset_version IS NULL AND id IN ({placeholders})",
+                         (dataset_version, *ids))
+            self._note_version(conn, dataset_version)
+            conn.commit()
+        except Exception as e:
+            print(f"PDL person store write failed: {e}")
+
+    def add_many(self, people, data_include=None, dataset_version=None):
+        """Store (or merge into) records for people that have a PDL id"""
+        people = [person for person in people if isinstance(person, dict) and person.get('id')]
+        if not people:
+            return
+        try:
+            conn = self._connect()
+            now = time.time()
+            ids = [person['id'] for person in people]
+            placeholders = ','.join('?' * len(ids))
+            existing = {row[0]: row[1:] for row in conn.execute(
+                f"SELECT id, data_include, payload FROM pdl_people WHERE id IN ({placeholders})", ids)}
+            
+            records, terms = [], []
+            for person in people:
+                include = data_include
+                if person['id'] in existing:
+                    # Keep fields an earlier, wider fetch had
+                    old_include, old_payload = existing[person['id']]
+                    person = dict(json.loads(zlib.decompress(old_payload)), **person)
+                    include = None if old_include is None or data_include is None else \
+                        ','.join(sorted(set(old_include.split(',')) | set(data_include.split(','))))
+                payload = zlib.compress(json.dumps(person, separators=(',', ':')).encode('utf-8'))
+                records.append((person['id'], dataset_version, include, now, payload))
+                terms.extend((term_type, term, person['id']) for term_type, term in person_index_terms(person))
+            
+            conn.execute(f"DELETE FROM pdl_people_terms WHERE person_id IN ({placeholders})", ids)
+            conn.executemany("INSERT OR REPLACE INTO pdl_people (id, dataset_version, data_include, fetched_at, payload) VALUES (?,?,?,?,?)", records)
+            conn.executemany("INSERT OR IGNORE INTO pdl_people_terms (term_type, term, person_id) VALUES (?,?,?)", terms)
+            self._note_version(conn, dataset_version)
+            conn.commit()
+        except Exception as e:
+            print(f"PDL person store write failed: {e}")
+            return
+        
+        with self._lock:
+            self._writes += len(records)
+            due = self._writes >= self.TRIM_EVERY_N_WRITES
+            if due:
+                self._writes = 0
+        if due:
+            self.trim()
+
+    def search(self, criteria, data_include=None, limit=25):
+        """Up to limit fresh stored people matching criteria, most recently fetched first
+        
+        criteria keys: title (every word must be in the person's title), company, and the
+        location as metro and/or city (+ region); when both are given either may match.
+        People in criteria['exclusions'] (SearchExclusions) are skipped.
+        """
+        title_tokens = re.findall(r'[a-z0-9]+', str(criteria.get('title') or '').lower())
+        if not title_tokens or limit <= 0:
+            return []
+        
+        term_sql = "id IN (SELECT person_id FROM pdl_people_terms WHERE term_type = ? AND term = ?)"
+        clauses, args = [], []
+        for token in title_tokens:
+            clauses.append(term_sql)
+            args.extend(['title', token])
+        if criteria.get('company'):
+            clauses.append(term_sql)
+            args.extend(['company', normalize_cache_key(criteria['company'])])
+        
+        location_clauses = []
+        if criteria.get('metro'):
+            location_clauses.append(term_sql)
+            args.extend(['metro', normalize_cache_key(criteria['metro'])])
+        if criteria.get('city'):
+            city_clause = term_sql
+            args.extend(['city', normalize_cache_key(criteria['city'])])
+            if criteria.get('region'):
+                city_clause += " AND " + term_sql
+                args.extend(['region', normalize_cache_key(criteria['region'])])
+            location_clauses.append(f"({city_clause})")
+        if location_clauses:
+            clauses.append(f"({' OR '.join(location_clauses)})")
+        
+        people = []
+        try:
+            conn = self._connect()
+            latest = self._latest_version(conn)
+            rows = conn.execute(f"""
+              SELECT data_include, payload FROM pdl_people
+              WHERE fetched_at >= ? AND (? IS NULL OR dataset_version = ?) AND {' AND '.join(clauses)}
+              ORDER BY fetched_at DESC
+            """, (time.time() - self.max_age, latest, latest, *args))
+            for stored_include, payload in rows:
+                if self._covers(stored_include, data_include):
+                    person = json.loads(zlib.decompress(payload))
+                    if person_is_excluded(person, criteria.get('exclusions')):
+                        continue
+                    people.append(person)
+                    if len(people) >= limit:
+                        break
+        except Exception as e:
+            print(f"PDL person store read failed: {e}")
+            return []
+        return people
+
+    def trim(self):
+        """Drop expired records, then the oldest beyond max_records"""
+        try:
+            conn = self._connect()
+            cutoff = time.time() - self.max_age
+            stale = "SELECT id FROM pdl_people WHERE fetched_at < ?"
+            conn.execute(f"DELETE FROM pdl_people_terms WHERE person_id IN ({stale})", (cutoff,))
+            conn.execute(f"DELETE FROM pdl_people WHERE id IN ({stale})", (cutoff,))
+            overflow = "SELECT id FROM pdl_people ORDER BY fetched_at DESC LIMIT -1 OFFSET ?"
+            conn.execute(f"DELETE FROM pdl_people_terms WHERE person_id IN ({overflow})", (self.max_records,))
+            conn.execute(f"DELETE FROM pdl_people WHERE id IN ({overflow})", (self.max_records,))
+            conn.commit()
+        except Exception as e:
+            print(f"PDL person store trim failed: {e}")
+
+    def stats(self):
+        try:
+            conn = self._connect()
+            records, oldest = conn.execute("SELECT COUNT(*), MIN(fetched_at) FROM pdl_people").fetchone()
+            return {'records': records, 'dataset_version': self._latest_version(conn),
+                    'oldest_age_seconds': round(time.time() - oldest) if oldest else None}
+        except Exception as e:
+            print(f"PDL person store stats failed: {e}")
+            return {}
+
+pdl_person_store = PDLPersonStore(PDL_CACHE_PATH)
+
+# ========================================
+# REQUEST COALESCING (singleflight)
+# ========================================
+
+class _InFlightCall:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Coalesces concurrent identical calls within this process.
+    
+    The first caller for a key runs the function; callers arriving with the same key
+    while it is in flight block and receive the shared result or re-raise the shared
+    error. The leader snapshots the result (deep copy) before waking waiters, and each
+    waiter gets its own copy of that snapshot, so the leader's caller can mutate its
+    contacts straight away without racing the waiters.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _InFlightCall()
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+        
+        result = None
+        try:
+            result = fn(*args, **kwargs)
+            return result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            # No new waiters can join once the call is unlisted; snapshot before anyone returns
+            if call.waiters:
+                if call.error is None:
+                    call.result = copy.deepcopy(result)
+                print(f"{self.name}: {call.waiters} concurrent caller(s) shared one upstream call")
+            call.done.set()
+
+    def stream(self, key, fn, *args, **kwargs):
+        """do() for a generator function: the leader's caller gets each item as it is produced
+        
+        Waiters block until the run is over and then get copies of every item. Items are
+        snapshotted as they pass through, since the leader's caller may mutate them right
+        away. If the leader's caller stops iterating early the run is abandoned (closing
+        fn's generator) unless someone is waiting for it, in which case it is finished.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _InFlightCall()
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            yield from copy.deepcopy(call.result)
+            return
+        
+        items = []
+        source = fn(*args, **kwargs)
+        try:
+            for item in source:
+                items.append(copy.deepcopy(item))
+                yield item
+        except GeneratorExit:
+            with self._lock:
+                if not call.waiters:
+                    self._calls.pop(key, None)
+            if not call.waiters:
+                source.close()
+                raise
+            # Waiters need the rest; nobody else holds these items, so no snapshot
+            try:
+                items.extend(source)
+            except Exception as e:
+                call.error = e
+            raise
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            if call.waiters:
+                if call.error is None:
+                    call.result = items
+                print(f"{self.name}: {call.waiters} concurrent caller(s) shared one upstream call")
+            call.done.set()
+
+pdl_singleflight = SingleFlight('PDL')
+openai_singleflight = SingleFlight('OpenAI')
+
+def coalesced_chat_completion(**request_kwargs):
+    """client.chat.completions.create, shared by concurrent identical requests when it is deterministic
+    
+    Only temperature=0 requests are coalesced; sampled completions are expected to differ
+    per call, so those go straight to OpenAI.
+    """
+    if request_kwargs.get('temperature', 1) != 0:
+        return client.chat.completions.create(**request_kwargs)
+    key = json.dumps(request_kwargs, sort_keys=True, default=str)
+    return openai_singleflight.do(key, client.chat.completions.create, **request_kwargs)
+
+# ========================================
+# OFFLINE US LOCATION GAZETTEER
+# ========================================
+
+US_LOCATION_GAZETTEER_PATH = os.getenv('US_LOCATION_GAZETTEER_PATH', os.path.join(os.path.dirname(__file__), 'us_locations.tsv'))
+US_COUNTRY_NAMES = {'us', 'usa', 'u s', 'u s a', 'united states', 'united states of america', 'america'}
+
+@functools.lru_cache(maxsize=1)
+def load_us_location_gazetteer():
+    """Read the bundled gazetteer on first use
+    
+    Returns (states, cities, aliases):
+      states:  state name or abbreviation -> full state name
+      cities:  city -> set of full state names it is known in
+      aliases: shorthand ("nyc", "philly", bare "portland") -> (city, full state name)
+    """
+    rows = []
+    try:
+        with open(US_LOCATION_GAZETTEER_PATH, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip() or line.startswith('#'):
+                    continue
+                rows.append(line.rstrip('\n').split('\t'))
+    except OSError as e:
+        print(f"US location gazetteer unavailable, every location goes to PDL: {e}")
+        return {}, {}, {}
+    
+    abbreviations = {abbr: name for kind, name, _, abbr in rows if kind == 'state'}
+    states, cities, aliases = {}, {}, {}
+    for kind, name, city, abbr in rows:
+        state = abbreviations.get(abbr)
+        if not state:
+            continue
+        if kind == 'state':
+            states[name] = state
+            states[abbr] = state
+        elif kind == 'city':
+            cities.setdefault(name, set()).add(state)
+        elif kind == 'alias':
+            aliases[name] = (city, state)
+    print(f"Loaded US location gazetteer: {len(cities)} cities, {len(aliases)} aliases")
+    return states, cities, aliases
+
+def split_trailing_state(text, states):
+    """'boston ma' -> ['boston', 'ma'] when the input ends in a state name or abbreviation"""
+    words = text.split()
+    for length in (3, 2, 1):
+        if len(words) > length:
+            suffix = ' '.join(words[-length:])
+            if suffix in states:
+                return [' '.join(words[:-length]), suffix]
+    return [text]
+
+@functools.lru_cache(maxsize=4096)
+def resolve_us_location(location):
+    """Normalize a well-known US location locally, in PDL Cleaner's format
+    
+    "Boston, MA" -> "boston, massachusetts, united states", "NYC" -> "new york, new york, united states",
+    "Texas" -> "texas, united states". Returns None for anything the gazetteer cannot resolve
+    unambiguously (unknown cities, bare city names found in several states), which then go to PDL.
+    """
+    states, cities, aliases = load_us_location_gazetteer()
+    if not states:
+        return None
+    
+    text = re.sub(r'\s+', ' ', (location or '').lower().replace('.', '')).strip()
+    parts = [part.strip() for part in text.split(',') if part.strip()]
+    if len(parts) > 1 and parts[-1] in US_COUNTRY_NAMES:
+        parts.pop()
+    if len(parts) == 1 and parts[0] not in aliases and parts[0] not in cities and parts[0] not in states:
+        parts = split_trailing_state(parts[0], states)
+    
+    if len(parts) == 1:
+        name = parts[0]
+        if name in aliases:
+            city, state = aliases[name]
+            return f"{city}, {state}, united states"
+        known_in = cities.get(name, set())
+        if name in states:
+            # "washington" is both a state and a city - leave that to PDL
+            return f"{states[name]}, united states" if not known_in else None
+        if len(known_in) == 1:
+            return f"{name}, {next(iter(known_in))}, united states"
+        return None
+    
+    if len(parts) == 2:
+        name, state = parts[0], states.get(parts[1])
+        if not state:
+            return None
+        if state in cities.get(name, ()):
+            return f"{name}, {state}, united states"
+        if name in aliases and aliases[name][1] == state:
+            return f"{aliases[name][0]}, {state}, united states"
+    
+    return None
+
 # ========================================
 # PDL CLEANER APIS (for better matching)
 # ========================================
 
 def clean_company_name(company):
-    """Clean company name using PDL Cleaner API for better matching"""
+    """Clean company name using PDL Cleaner API for better matching (cached)"""
+    cache_key = normalize_cache_key(company)
+    cached = pdl_cache.get('company_clean', cache_key)
+    if cached:
+        return company if cached.negative else cached.value
+    
+    cleaned_name = pdl_singleflight.do(('company_clean', cache_key), fetch_clean_company_name, company, cache_key)
+    return cleaned_name or company
+
+def fetch_clean_company_name(company, cache_key):
+    """Call PDL Company Cleaner and cache the answer. Returns None if the name could not be cleaned."""
     try:
         print(f"Cleaning company name: {company}")
         
-        response = requests.get(
-            f"{PDL_BASE_URL}/company/clean",
-            params={
-                'api_key': PEOPLE_DATA_LABS_API_KEY,
-                'name': company
-            },
-            timeout=10
-        )
+        response = pdl_client.get('/company/clean', params={'name': company})
         
         if response.status_code == 200:
             clean_data = response.json()
             if clean_data.get('status') == 200 and clean_data.get('name'):
                 cleaned_name = clean_data['name']
                 print(f"Cleaned company: '{company}' -> '{cleaned_name}'")
+                pdl_cache.set('company_clean', cache_key, cleaned_name, CLEANER_CACHE_TTL_SECONDS)
                 return cleaned_name
+        
+        # PDL answered but could not clean this name - don't ask again for a while
+        if response.status_code in (200, 400, 404):
+            pdl_cache.set_negative('company_clean', cache_key, CLEANER_NEGATIVE_TTL_SECONDS)
     
     except Exception as e:
         print(f"Company cleaning failed: {e}")
     
-    return company
+    return None
 
 def clean_location_name(location):
-    """Clean location name using PDL Cleaner API for better matching"""
+    """Clean location name using the local gazetteer, falling back to the PDL Cleaner API (cached)"""
+    local_location = resolve_us_location(location)
+    if local_location:
+        return local_location
+    
+    cache_key = normalize_cache_key(location)
+    cached = pdl_cache.get('location_clean', cache_key)
+    if cached:
+        return location if cached.negative else cached.value
+    
+    cleaned_location = pdl_singleflight.do(('location_clean', cache_key), fetch_clean_location_name, location, cache_key)
+    return cleaned_location or location
+
+def fetch_clean_location_name(location, cache_key):
+    """Call PDL Location Cleaner and cache the answer. Returns None if the location could not be cleaned."""
     try:
         print(f"Cleaning location: {location}")
         
-        response = requests.get(
-            f"{PDL_BASE_URL}/location/clean",
-            params={
-                'api_key': PEOPLE_DATA_LABS_API_KEY,
-                'location': location
-            },
-            timeout=10
-        )
+        response = pdl_client.get('/location/clean', params={'location': location})
         
         if response.status_code == 200:
             clean_data = response.json()
             if clean_data.get('status') == 200 and clean_data.get('name'):
                 cleaned_location = clean_data['name']
                 print(f"Cleaned location: '{location}' -> '{cleaned_location}'")
+                pdl_cache.set('location_clean', cache_key, cleaned_location, CLEANER_CACHE_TTL_SECONDS)
                 return cleaned_location
+        
+        if response.status_code in (200, 400, 404):
+            pdl_cache.set_negative('location_clean', cache_key, CLEANER_NEGATIVE_TTL_SECONDS)
     
     except Exception as e:
         print(f"Location cleaning failed: {e}")
     
-    return location
+    return None
 
 # ========================================
 # ENHANCED PDL APIS
 # ========================================
 
-def enrich_job_title_with_pdl(job_title):
-    """Use PDL Job Title Enrichment API to get standardized job titles"""
+JOB_TITLE_CACHE_FRESH_SECONDS = int(os.getenv('PDL_JOB_TITLE_CACHE_FRESH_SECONDS', str(7 * 24 * 3600)))
+JOB_TITLE_CACHE_MAX_AGE_SECONDS = int(os.getenv('PDL_JOB_TITLE_CACHE_MAX_AGE_SECONDS', str(90 * 24 * 3600)))
+JOB_TITLE_NEGATIVE_TTL_SECONDS = int(os.getenv('PDL_JOB_TITLE_NEGATIVE_TTL_SECONDS', str(24 * 3600)))
+
+# Shorthand students commonly type, expanded so "SWE" can reuse the "Software Engineer" cache entry
+JOB_TITLE_ABBREVIATIONS = {
+    'swe': 'software engineer',
+    'sde': 'software development engineer',
+    'ib': 'investment banking',
+    'pe': 'private equity',
+    'vc': 'venture capital',
+    'pm': 'product manager',
+    'vp': 'vice president',
+    'svp': 'senior vice president',
+    'evp': 'executive vice president',
+    'md': 'managing director',
+    'sr': 'senior',
+    'jr': 'junior',
+    'mgr': 'manager',
+    'eng': 'engineer',
+    'engr': 'engineer',
+    'dev': 'developer',
+    'ml': 'machine learning',
+    'ai': 'artificial intelligence',
+    'hr': 'human resources',
+    'assoc': 'associate',
+    'asst': 'assistant',
+    'acct': 'accountant',
+    'ops': 'operations',
+    'mktg': 'marketing',
+}
+
+_job_title_refreshes_in_flight = set()
+_job_title_refresh_lock = threading.Lock()
+
+def job_title_cache_key(job_title):
+    """Cache key for the title as typed: case, punctuation and whitespace normalized only"""
+    return ' '.join(re.sub(r'[^\w\s&/+-]', ' ', str(job_title or '').lower()).split())
+
+def normalize_job_title(job_title):
+    """job_title_cache_key with common abbreviations expanded ("swe" -> "software engineer")"""
+    return ' '.join(JOB_TITLE_ABBREVIATIONS.get(word, word) for word in job_title_cache_key(job_title).split())
+
+def default_job_title_enrichment(job_title):
+    return {
+        'cleaned_name': job_title,
+        'similar_titles': [],
+        'levels': [],
+        'categories': []
+    }
+
+def job_title_enrichment_for(enrichment, job_title):
+    """A cached enrichment as seen by one caller: without a PDL cleaned_name, their own title"""
+    if enrichment.get('cleaned_name'):
+        return enrichment
+    return dict(enrichment, cleaned_name=job_title)
+
+def fetch_job_title_enrichment(job_title, cache_key):
+    """Call PDL Job Title Enrichment (coalescing concurrent identical calls). Returns None on failure.
+    
+    PDL is sent the title as the user typed it; cache_key is job_title_cache_key of that
+    title, so whatever PDL answers (or doesn't) is only stored for the same spelling.
+    """
+    return pdl_singleflight.do(('job_title_enrich', cache_key), _fetch_job_title_enrichment,
+                               job_title, cache_key)
+
+def _fetch_job_title_enrichment(job_title, cache_key):
     try:
         print(f"Enriching job title: {job_title}")
         
-        response = requests.get(
-            f"{PDL_BASE_URL}/job_title/enrich",
-            params={
-                'api_key': PEOPLE_DATA_LABS_API_KEY,
-                'job_title': job_title
-            },
-            timeout=10
-        )
+        response = pdl_client.get('/job_title/enrich', params={'job_title': job_title})
         
         if response.status_code == 200:
             enrich_data = response.json()
@@ -382,26 +1910,150 @@ def enrich_job_title_with_pdl(job_title):
                 
                 # Extract useful enrichment data
                 result = {
-                    'cleaned_name': enriched_data.get('cleaned_name', job_title),
+                    'cleaned_name': enriched_data.get('cleaned_name'),
                     'similar_titles': enriched_data.get('similar_job_titles', []),
                     'levels': enriched_data.get('job_title_levels', []),
                     'categories': enriched_data.get('job_title_categories', [])
                 }
                 
                 print(f"Job title enrichment successful: {result}")
+                pdl_cache.set('job_title_enrich', cache_key, result, JOB_TITLE_CACHE_MAX_AGE_SECONDS)
                 return result
+        
+        if response.status_code in (200, 400, 404):
+            pdl_cache.set_negative('job_title_enrich', cache_key, JOB_TITLE_NEGATIVE_TTL_SECONDS)
     
     except Exception as e:
         print(f"Job title enrichment failed: {e}")
     
-    return {
-        'cleaned_name': job_title,
-        'similar_titles': [],
-        'levels': [],
-        'categories': []
-    }
+    return None
+
+def refresh_job_title_enrichment_async(job_title, cache_key):
+    """Re-fetch a stale enrichment on a background thread, at most once per title at a time"""
+    with _job_title_refresh_lock:
+        if cache_key in _job_title_refreshes_in_flight:
+            return
+        _job_title_refreshes_in_flight.add(cache_key)
+    
+    def refresh():
+        try:
+            fetch_job_title_enrichment(job_title, cache_key)
+        finally:
+            with _job_title_refresh_lock:
+                _job_title_refreshes_in_flight.discard(cache_key)
+    
+    threading.Thread(target=refresh, name='job-title-refresh', daemon=True).start()
+
+def enrich_job_title_with_pdl(job_title):
+    """Use PDL Job Title Enrichment API to get standardized job titles
+    
+    Cached entries are returned immediately; once older than JOB_TITLE_CACHE_FRESH_SECONDS
+    they are still served while a background refresh fetches a new copy. Entries are
+    keyed by the title PDL was sent. An abbreviated title ("SWE") with no entry of its
+    own borrows the spelled-out title's answer when there is one, but never writes it.
+    """
+    cache_key = job_title_cache_key(job_title)
+    if not cache_key:
+        return default_job_title_enrichment(job_title)
+    
+    cached = pdl_cache.get('job_title_enrich', cache_key)
+    if cached:
+        if cached.negative:
+            return default_job_title_enrichment(job_title)
+        if time.time() - cached.fetched_at > JOB_TITLE_CACHE_FRESH_SECONDS:
+            refresh_job_title_enrichment_async(job_title, cache_key)
+        return job_title_enrichment_for(cached.value, job_title)
+    
+    normalized_title = normalize_job_title(job_title)
+    if normalized_title != cache_key:
+        shared = pdl_cache.get('job_title_enrich', normalized_title)
+        if shared and not shared.negative:
+            return job_title_enrichment_for(shared.value, job_title)
+    
+    enrichment = fetch_job_title_enrichment(job_title, cache_key)
+    return job_title_enrichment_for(enrichment, job_title) if enrichment else default_job_title_enrichment(job_title)
+
+AUTOCOMPLETE_PAGE_SIZE = 10
+AUTOCOMPLETE_CACHE_TTL_SECONDS = int(os.getenv('PDL_AUTOCOMPLETE_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+AUTOCOMPLETE_INDEX_MAX_PREFIXES = int(os.getenv('PDL_AUTOCOMPLETE_INDEX_MAX_PREFIXES', '5000'))
+# A non-exhaustive shorter prefix can answer a longer one once filtering leaves at least this many suggestions
+AUTOCOMPLETE_MIN_WARM_RESULTS = 3
+
+class AutocompletePrefixIndex:
+    """In-memory prefix index of past PDL autocomplete answers for one data_type.
+    
+    PDL returns suggestions ranked by count. When the answer for "gol" was exhaustive (fewer
+    than a full page), filtering it down to those matching "gold" gives the complete, ranked
+    answer for "gold". A non-exhaustive answer only holds the top page for "gol", so its
+    filtered list is just the part of that page matching "gold", not necessarily the top
+    results for "gold"; it is used once it still holds AUTOCOMPLETE_MIN_WARM_RESULTS suggestions.
+    Derived answers are stored like fetched ones and count toward max_prefixes.
+    """
+
+    def __init__(self, max_prefixes=AUTOCOMPLETE_INDEX_MAX_PREFIXES):
+        self.max_prefixes = max_prefixes
+        self._entries = OrderedDict()  # prefix -> (suggestions, exhaustive)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def matches(suggestion, prefix):
+        name = suggestion.get('name', '') if isinstance(suggestion, dict) else str(suggestion)
+        name = name.lower()
+        return name.startswith(prefix) or f" {prefix}" in name
+
+    def store(self, prefix, suggestions, exhaustive):
+        with self._lock:
+            self._entries[prefix] = (suggestions, exhaustive)
+            self._entries.move_to_end(prefix)
+            while len(self._entries) > self.max_prefixes:
+                self._entries.popitem(last=False)
+
+    def lookup(self, prefix):
+        """Suggestions for prefix answered from memory, or None when PDL must be asked"""
+        with self._lock:
+            entry = self._entries.get(prefix)
+            if entry is not None:
+                self._entries.move_to_end(prefix)
+                return entry[0]
+            shorter = next((self._entries[prefix[:length]] for length in range(len(prefix) - 1, 1, -1)
+                            if prefix[:length] in self._entries), None)
+        if shorter is None:
+            return None
+        suggestions, exhaustive = shorter
+        filtered = [s for s in suggestions if self.matches(s, prefix)]
+        if not exhaustive and len(filtered) < AUTOCOMPLETE_MIN_WARM_RESULTS:
+            return None
+        self.store(prefix, filtered, exhaustive)
+        return filtered
+
+autocomplete_indexes = {}
+_autocomplete_indexes_lock = threading.Lock()
+
+def get_autocomplete_index(data_type):
+    with _autocomplete_indexes_lock:
+        if data_type not in autocomplete_indexes:
+            autocomplete_indexes[data_type] = AutocompletePrefixIndex()
+        return autocomplete_indexes[data_type]
 
 def get_autocomplete_suggestions(query, data_type='job_title'):
+    """Autocomplete from the local prefix index, falling back to PDL on a real miss"""
+    prefix = normalize_cache_key(query)
+    index = get_autocomplete_index(data_type)
+    
+    suggestions = index.lookup(prefix)
+    if suggestions is not None:
+        return suggestions
+    
+    # Another worker may already have asked PDL for this exact prefix
+    cached = pdl_cache.get(f'autocomplete_{data_type}', prefix)
+    if cached:
+        suggestions, exhaustive = cached.value
+        index.store(prefix, suggestions, exhaustive)
+        return suggestions
+    
+    return fetch_autocomplete_suggestions(prefix, data_type)
+
+def fetch_autocomplete_suggestions(query, data_type='job_title'):
     """Enhanced autocomplete with proper PDL field mapping"""
     try:
         print(f"Getting autocomplete suggestions for {data_type}: {query}")
@@ -423,28 +2075,31 @@ def get_autocomplete_suggestions(query, data_type='job_title'):
         
         print(f"Mapping {data_type} -> {pdl_field} for PDL API")
         
-        response = requests.get(
-            f"{PDL_BASE_URL}/autocomplete",
+        # A user is waiting on every keystroke, so retry at most once
+        response = pdl_client.get(
+            '/autocomplete',
             params={
-                'api_key': PEOPLE_DATA_LABS_API_KEY,
                 'field': pdl_field,  # Use the mapped field name
                 'text': query,
-                'size': 10
+                'size': AUTOCOMPLETE_PAGE_SIZE
             },
-            timeout=15
+            max_retries=1
         )
         
         print(f"PDL autocomplete response: {response.status_code}")
         
         if response.status_code == 200:
             auto_data = response.json()
-            if auto_data.get('status') == 200 and auto_data.get('data'):
-                suggestions = auto_data['data']
+            suggestions = auto_data.get('data') if auto_data.get('status') == 200 else None
+            if suggestions:
                 print(f"Autocomplete suggestions: {suggestions}")
-                return suggestions
             else:
                 print(f"PDL autocomplete no data: {auto_data}")
-                return []
+                suggestions = []
+            exhaustive = len(suggestions) < AUTOCOMPLETE_PAGE_SIZE
+            get_autocomplete_index(data_type).store(query, suggestions, exhaustive)
+            pdl_cache.set(f'autocomplete_{data_type}', query, [suggestions, exhaustive], AUTOCOMPLETE_CACHE_TTL_SECONDS)
+            return suggestions
         
         elif response.status_code == 400:
             try:
@@ -460,13 +2115,12 @@ def get_autocomplete_suggestions(query, data_type='job_title'):
         elif response.status_code == 402:
             print("PDL API: Payment required for autocomplete")
             return []
-        elif response.status_code == 429:
-            print("PDL API rate limited for autocomplete")
-            return []
         else:
             print(f"PDL autocomplete error {response.status_code}: {response.text}")
             return []
     
+    except PDLRateLimitError:
+        raise
     except requests.exceptions.Timeout:
         print(f"Autocomplete timeout for {data_type}: {query}")
         return []
@@ -478,6 +2132,62 @@ def get_autocomplete_suggestions(query, data_type='job_title'):
 # SMART LOCATION STRATEGY
 # ========================================
 
+# Trailing words a metro key can be written without ("washington, dc", "salt lake, ut") when
+# the location's state part is the metro's own state
+METRO_KEY_QUALIFIERS = ('city', 'dc')
+# Shorthands that only name a metro when they are the whole city field ("la", never "la jolla")
+METRO_ALIAS_KEYS = frozenset({'sf', 'la', 'nyc', 'dc'})
+
+def build_metro_token_index(metro_areas):
+    """Map each metro key's word tuple to the key, e.g. ('new', 'york', 'city') -> 'new york city'
+    
+    Returns (index, stripped, max_tokens). METRO_ALIAS_KEYS are left out of index. Keys
+    ending in a METRO_KEY_QUALIFIERS word go into stripped without it (unless that is a
+    key of its own); match_metro_area only uses those when the state part fits.
+    """
+    index = {tuple(name.split()): name for name in metro_areas if name not in METRO_ALIAS_KEYS}
+    stripped = {}
+    for tokens, name in index.items():
+        if len(tokens) > 1 and tokens[-1] in METRO_KEY_QUALIFIERS and tokens[:-1] not in index:
+            stripped.setdefault(tokens[:-1], name)
+    return index, stripped, max((len(tokens) for tokens in index), default=0)
+
+METRO_TOKEN_INDEX, METRO_STRIPPED_TOKEN_INDEX, METRO_MAX_TOKENS = build_metro_token_index(PDL_METRO_AREAS)
+
+def metro_in_state(metro_key, state):
+    """Whether a location's state part (full name or abbreviation, e.g. "d.c.") is the metro's state"""
+    state = ' '.join(re.sub(r'[^a-z\s]', '', (state or '').lower()).split())
+    if not state:
+        return False
+    states = load_us_location_gazetteer()[0]
+    return states.get(state, state) == PDL_METRO_AREAS[metro_key].rsplit(', ', 1)[-1]
+
+def match_metro_area(text, state=None):
+    """Longest, most specific metro key appearing in text as whole words, or None
+    
+    Looks up each word window (up to the longest key's length) in a dict built once at
+    import, so the cost grows with the input rather than the metro table, and short keys
+    like "la" only match the word "la" - never the inside of "atlanta". A key written
+    without its qualifier ("washington") only matches when state is that metro's state.
+    """
+    tokens = re.findall(r'[a-z0-9]+', (text or '').lower())
+    best_key = None
+    best_rank = (0, 0)
+    for start in range(len(tokens)):
+        for length in range(min(METRO_MAX_TOKENS, len(tokens) - start), 0, -1):
+            window = tuple(tokens[start:start + length])
+            key = METRO_TOKEN_INDEX.get(window)
+            if not key:
+                key = METRO_STRIPPED_TOKEN_INDEX.get(window)
+                if key and not metro_in_state(key, state):
+                    key = None
+            if key:
+                rank = (length, len(key))
+                if rank > best_rank:
+                    best_key, best_rank = key, rank
+                break
+    return best_key
+
 def determine_location_strategy(location_input):
     """Determine whether to use metro or locality search based on input location"""
     try:
@@ -506,13 +2216,11 @@ def determine_location_strategy(location_input):
             metro_key = location_lower
             metro_location = PDL_METRO_AREAS[location_lower]
         
-        # Check for partial matches (e.g., "san francisco, ca" matches "san francisco")
+        # Whole-word partial matches (e.g., "downtown san francisco" matches "san francisco")
         else:
-            for metro_name in PDL_METRO_AREAS:
-                if metro_name in city or city in metro_name:
-                    metro_key = metro_name
-                    metro_location = PDL_METRO_AREAS[metro_name]
-                    break
+            metro_key = match_metro_area(city, state)
+            if metro_key:
+                metro_location = PDL_METRO_AREAS[metro_key]
         
         if metro_location:
             return {
@@ -548,21 +2256,196 @@ def determine_location_strategy(location_input):
 # ENHANCED PDL SEARCH IMPLEMENTATION
 # ========================================
 
-def search_contacts_with_smart_location_strategy(job_title, company, location, max_contacts=8):
-    """Enhanced search that intelligently chooses metro vs locality based on location input"""
+PDL_PREREQUISITE_WORKERS = int(os.getenv('PDL_PREREQUISITE_WORKERS', '12'))
+PDL_PREREQUISITE_DEADLINE_SECONDS = float(os.getenv('PDL_PREREQUISITE_DEADLINE_SECONDS', '12'))
+
+prerequisite_executor = ThreadPoolExecutor(max_workers=PDL_PREREQUISITE_WORKERS, thread_name_prefix='pdl-prereq')
+
+def run_search_prerequisites(job_title, company, location):
+    """Run job title enrichment, company cleaning and location cleaning concurrently
+    
+    All three share one deadline; a lookup that fails or misses it falls back to the raw
+    input (its thread keeps running and still fills the cache for the next search).
+    """
+    fallbacks = {
+        'enrichment': default_job_title_enrichment(job_title),
+        'company': company or '',
+        'location': location
+    }
+    futures = {
+        'enrichment': prerequisite_executor.submit(enrich_job_title_with_pdl, job_title),
+        'company': prerequisite_executor.submit(clean_company_name, company) if company else None,
+        'location': prerequisite_executor.submit(clean_location_name, location)
+    }
+    
+    deadline = time.monotonic() + PDL_PREREQUISITE_DEADLINE_SECONDS
+    results = {}
+    for name, future in futures.items():
+        if future is None:
+            results[name] = fallbacks[name]
+            continue
+        try:
+            results[name] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            print(f"Search prerequisite '{name}' missed the {PDL_PREREQUISITE_DEADLINE_SECONDS}s deadline, using raw input")
+            results[name] = fallbacks[name]
+        except Exception as e:
+            print(f"Search prerequisite '{name}' failed: {e}")
+            results[name] = fallbacks[name]
+    return results
+
+# ========================================
+# ADAPTIVE SEARCH PLANNER (learned from past outcomes)
+# ========================================
+
+SEARCH_PLANNER_ENABLED = os.getenv('SEARCH_PLANNER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SEARCH_PLANNER_MIN_SAMPLES = int(os.getenv('SEARCH_PLANNER_MIN_SAMPLES', '2'))
+SEARCH_PLANNER_HISTORY_DAYS = int(os.getenv('SEARCH_PLANNER_HISTORY_DAYS', '30'))
+# Never ask PDL for more than this many times max_contacts (and never more than PDL's page limit)
+SEARCH_PLANNER_MAX_SIZE_FACTOR = 3
+# PDL bills per record returned: at most this many records (credits) beyond max_contacts per search
+SEARCH_PLANNER_OVERFETCH_CREDITS = int(os.getenv('SEARCH_PLANNER_OVERFETCH_CREDITS', '16'))
+PDL_MAX_SEARCH_SIZE = 100
+
+def contact_has_email(contact):
+    email = contact.get('Email')
+    return bool(email) and email != 'Not available'
+
+def contact_richness(contact):
+    """Number of filled-in fields, to keep the fuller of two records for the same person"""
+    return sum(1 for value in contact.values() if value and value != 'Not available')
+
+def search_outcome_key(location_strategy, company, primary_title):
+    """(location, company, title level) that past outcomes are grouped by"""
+    location_key = location_strategy['matched_metro'] or f"{location_strategy['city']}|{location_strategy['state'] or ''}"
+    return location_key, normalize_cache_key(company or ''), determine_job_level(primary_title)
+
+def record_search_outcome(outcome_key, strategy, requested, contacts, latency):
+    """Store how one search strategy did so later searches can plan from it"""
+    try:
+        with get_db() as db:
+            db.execute("""
+              INSERT INTO search_outcomes (location_key, company_key, title_level, strategy, requested, contacts, with_email, latency_ms)
+              VALUES (?,?,?,?,?,?,?,?)
+            """, (*outcome_key, strategy, requested, len(contacts),
+                  sum(1 for c in contacts if contact_has_email(c)), int(latency * 1000)))
+            db.commit()
+    except Exception as e:
+        print(f"Failed to record search outcome: {e}")
+
+def plan_search_strategy(outcome_key, candidates, max_contacts):
+    """Best historical strategy for this key and the size to request, or (None, max_contacts)
+    
+    A strategy needs SEARCH_PLANNER_MIN_SAMPLES recent outcomes to be considered. The
+    one with the highest email fill rate (contacts with email per record requested) wins,
+    ties going to the faster one, and the size is scaled up by that fill rate so the
+    first query is expected to come back with max_contacts usable contacts. The extra
+    records are capped at SEARCH_PLANNER_OVERFETCH_CREDITS, since each one costs a credit.
+    """
+    if not SEARCH_PLANNER_ENABLED:
+        return None, max_contacts
+    try:
+        with get_db() as db:
+            rows = db.execute(f"""
+              SELECT strategy, COUNT(*) AS samples,
+                     AVG(MIN(1.0, with_email * 1.0 / requested)) AS fill_rate,
+                     AVG(latency_ms) AS latency_ms
+              FROM search_outcomes
+              WHERE location_key = ? AND company_key = ? AND title_level = ? AND requested > 0
+                AND created_at >= datetime('now', '-{SEARCH_PLANNER_HISTORY_DAYS} days')
+                AND strategy IN ({','.join('?' * len(candidates))})
+              GROUP BY strategy
+            """, (*outcome_key, *candidates)).fetchall()
+    except Exception as e:
+        print(f"Search planner unavailable: {e}")
+        return None, max_contacts
+    
+    rows = [row for row in rows if row['samples'] >= SEARCH_PLANNER_MIN_SAMPLES and row['fill_rate'] > 0]
+    if not rows:
+        return None, max_contacts
+    best = max(rows, key=lambda row: (row['fill_rate'], -(row['latency_ms'] or 0)))
+    size = math.ceil(max_contacts / best['fill_rate'])
+    size = max(max_contacts, min(size, max_contacts * SEARCH_PLANNER_MAX_SIZE_FACTOR,
+                                 max_contacts + SEARCH_PLANNER_OVERFETCH_CREDITS, PDL_MAX_SEARCH_SIZE))
+    print(f"Search planner: {best['strategy']} (fill rate {best['fill_rate']:.2f} over {best['samples']} searches), size {size}")
+    return best['strategy'], size
+
+SEARCH_STRATEGIES = ('composite', 'metro', 'locality', 'levels')
+
+def plan_search_chain(outcome_key, location_strategy, max_contacts):
+    """(chain, first_size): the searches to run in order, as far as they are needed, and the first one's size
+    
+    Static rules: metro areas go metro -> locality, elsewhere locality -> broader title
+    levels; the composite query already covers metro and locality. Past outcomes for
+    this location/company/level can override the first step and its size.
+    """
+    if PDL_COMPOSITE_SEARCH:
+        chain = ['composite'] if location_strategy['strategy'] == 'metro_primary' else ['composite', 'levels']
+    elif location_strategy['strategy'] == 'metro_primary':
+        chain = ['metro', 'locality']
+    else:
+        chain = ['locality', 'levels']
+    
+    candidates = [name for name in SEARCH_STRATEGIES if name != 'metro' or location_strategy['metro_location']]
+    planned, first_size = plan_search_strategy(outcome_key, candidates, max_contacts)
+    if planned and planned != chain[0]:
+        chain = [planned] + [name for name in chain if name != planned][:1]
+    return chain, first_size
+
+def contact_identity_keys(contact):
+    """Hashable keys identifying the person behind a contact: PDL id, LinkedIn URL, primary email"""
+    keys = []
+    if contact.get('PdlId'):
+        keys.append(('id', contact['PdlId']))
+    linkedin = normalize_linkedin_url(contact.get('LinkedIn'))
+    if linkedin:
+        keys.append(('linkedin', linkedin))
+    email = normalize_email(contact.get('Email'))
+    if email:
+        keys.append(('email', email))
+    # Nothing to identify the person by: fall back to the whole record
+    return keys or [('contact', tuple(contact.items()))]
+
+def search_contacts_with_smart_location_strategy(job_title, company, location, max_contacts=8, fields=None, exclusions=None):
+    """Enhanced search that intelligently chooses metro vs locality based on location input
+    
+    Collects iter_contacts_with_smart_location_strategy; see there for fields and exclusions.
+    Raises PDLRateLimitError if PDL capacity runs out before any contacts were found.
+    """
+    return list(iter_contacts_with_smart_location_strategy(job_title, company, location, max_contacts,
+                                                           fields=fields, exclusions=exclusions))
+
+def iter_contacts_with_smart_location_strategy(job_title, company, location, max_contacts=8, fields=None, exclusions=None):
+    """Yield up to max_contacts contacts as PDL pages arrive, choosing metro vs locality from the location
+    
+    fields, when given, is the tier's contact field list: only the PDL data needed for
+    those fields is requested and only those fields are extracted. exclusions
+    (SearchExclusions) are people the user already has; PDL is asked to skip them.
+    
+    Contacts with an email are yielded as soon as their page arrives; those without
+    are held back and only fill whatever is left of max_contacts at the end. A person
+    found again by a later step is skipped, unless they are still held back and the new
+    record is richer: then it takes the held one's place (and is yielded right away if
+    it brings an email). Once max_contacts contacts with an email are out, no further
+    pages are requested.
+    
+    Raises PDLRateLimitError if PDL capacity runs out before any contacts were found.
+    """
+    found_count = 0
+    yielded = 0
+    without_email = []
+    held = {}  # identity key -> index into without_email
+    seen = set()
     try:
         print(f"Starting smart location search for {job_title} at {company} in {location}")
         
-        # Step 1: Enrich job title
-        job_title_enrichment = enrich_job_title_with_pdl(job_title)
+        # Steps 1-3: Enrich job title, clean company and clean location (concurrently)
+        prerequisites = run_search_prerequisites(job_title, company, location)
+        job_title_enrichment = prerequisites['enrichment']
         primary_title = job_title_enrichment['cleaned_name']
         similar_titles = job_title_enrichment['similar_titles'][:3]
-        
-        # Step 2: Clean company
-        cleaned_company = clean_company_name(company) if company else ''
-        
-        # Step 3: Clean and analyze location
-        cleaned_location = clean_location_name(location)
+        cleaned_company = prerequisites['company']
+        cleaned_location = prerequisites['location']
         location_strategy = determine_location_strategy(cleaned_location)
         
         print(f"Location strategy: {location_strategy['strategy']}")
@@ -570,127 +2453,236 @@ def search_contacts_with_smart_location_strategy(job_title, company, location, m
             print(f"Matched metro: {location_strategy['matched_metro']} -> {location_strategy['metro_location']}")
         
         # Step 4: Execute search based on determined strategy
-        if location_strategy['strategy'] == 'metro_primary':
-            # Use metro search for major metro areas
-            contacts = try_metro_search_optimized(
-                primary_title, similar_titles, cleaned_company,
-                location_strategy, max_contacts
+        searches = {
+            # One ranked query covering metro OR locality and primary OR similar titles
+            'composite': lambda size: try_composite_search_optimized(
+                primary_title, similar_titles, cleaned_company, location_strategy, size,
+                fields=fields, exclusions=exclusions
+            ),
+            'metro': lambda size: try_metro_search_optimized(
+                primary_title, similar_titles, cleaned_company, location_strategy, size,
+                fields=fields, exclusions=exclusions
+            ),
+            'locality': lambda size: try_locality_search_optimized(
+                primary_title, similar_titles, cleaned_company, location_strategy, size,
+                fields=fields, exclusions=exclusions
+            ),
+            'levels': lambda size: try_job_title_levels_search_enhanced(
+                job_title_enrichment, cleaned_company,
+                location_strategy['city'], location_strategy['state'], size,
+                fields=fields, exclusions=exclusions
             )
-            
-            # If metro results are insufficient, add locality results
-            if len(contacts) < max_contacts // 2:
-                print(f"Metro results insufficient ({len(contacts)}), adding locality results")
-                locality_contacts = try_locality_search_optimized(
-                    primary_title, similar_titles, cleaned_company,
-                    location_strategy, max_contacts - len(contacts)
-                )
-                contacts.extend([c for c in locality_contacts if c not in contacts])
+        }
         
-        else:
-            # Use locality search for non-metro areas
-            contacts = try_locality_search_optimized(
-                primary_title, similar_titles, cleaned_company,
-                location_strategy, max_contacts
-            )
-            
-            # If locality results are insufficient, try broader search
-            if len(contacts) < max_contacts // 2:
-                print(f"Locality results insufficient ({len(contacts)}), trying broader search")
-                broader_contacts = try_job_title_levels_search_enhanced(
-                    job_title_enrichment, cleaned_company,
-                    location_strategy['city'], location_strategy['state'],
-                    max_contacts - len(contacts)
-                )
-                contacts.extend([c for c in broader_contacts if c not in contacts])
-        
-        print(f"Smart location search completed: {len(contacts)} contacts found")
-        return contacts[:max_contacts]
+        outcome_key = search_outcome_key(location_strategy, cleaned_company, primary_title)
+        chain, first_size = plan_search_chain(outcome_key, location_strategy, max_contacts)
         
+        for step, name in enumerate(chain):
+            if step == 0:
+                size = first_size
+            elif found_count < max_contacts // 2:
+                print(f"{chain[step - 1].title()} results insufficient ({found_count}), trying {name} search")
+                size = max_contacts - found_count
+            else:
+                break
+            started = time.monotonic()
+            found = []
+            pages = searches[name](size)
+            try:
+                for page in pages:
+                    found.extend(page)
+                    for contact in page:
+                        keys = contact_identity_keys(contact)
+                        matched = seen.intersection(keys)
+                        if matched:
+                            # Only a held-back person can still be swapped for a richer record
+                            indexes = {held.get(key) for key in matched}
+                            if len(indexes) != 1 or None in indexes:
+                                continue
+                            index = indexes.pop()
+                            if contact_richness(contact) <= contact_richness(without_email[index]):
+                                continue
+                            for key in contact_identity_keys(without_email[index]):
+                                held.pop(key, None)
+                            without_email[index] = None
+                        else:
+                            found_count += 1
+                        seen.update(keys)
+                        # A larger planned size can over-fetch; contacts with an email go first
+                        if yielded < max_contacts and contact_has_email(contact):
+                            yielded += 1
+                            yield contact
+                        else:
+                            held.update((key, len(without_email)) for key in keys)
+                            without_email.append(contact)
+                    if yielded >= max_contacts:
+                        break
+            finally:
+                pages.close()
+            # Stopping early leaves pages unread; rate the step on the records it did read
+            requested = len(found) if yielded >= max_contacts else size
+            record_search_outcome(outcome_key, name, requested, found, time.monotonic() - started)
+            if yielded >= max_contacts:
+                break
+        
+        print(f"Smart location search completed: {found_count} contacts found")
+    
+    except PDLRateLimitError as e:
+        if not found_count:
+            raise
+        print(f"Smart location search cut short ({e}), returning {min(found_count, max_contacts)} contacts")
     except Exception as e:
         print(f"Smart location search failed: {e}")
-        return []
+        return
+    
+    held_back = [contact for contact in without_email if contact is not None]
+    for contact in held_back[:max_contacts - yielded]:
+        yield contact
+
+# Send one boosted query instead of the metro -> locality fallback chain
+PDL_COMPOSITE_SEARCH = os.getenv('PDL_COMPOSITE_SEARCH', 'true').lower() in ('1', 'true', 'yes')
+
+def build_composite_search_query(primary_title, similar_titles, company, location_strategy, max_contacts, exclusions=None):
+    """Single bool query: (primary OR similar titles) AND company AND (metro OR locality)
+    
+    Boosts rank people matching the primary title above similar titles, and metro
+    matches above locality-only matches, so the best clause matches come back first.
+    """
+    title_clauses = [{"match": {"job_title": {"query": primary_title.lower(), "boost": 3}}}]
+    for title in similar_titles:
+        if title and title.lower() != primary_title.lower():
+            title_clauses.append({"match": {"job_title": {"query": title.lower(), "boost": 1}}})
+    
+    locality_clause = [{"match": {"location_locality": location_strategy['city'].lower()}}]
+    if location_strategy['state']:
+        locality_clause.append({"match": {"location_region": location_strategy['state'].lower()}})
+    location_clauses = [{"bool": {"must": locality_clause, "boost": 1}}]
+    if location_strategy['metro_location']:
+        location_clauses.insert(0, {"match": {"location_metro": {"query": location_strategy['metro_location'], "boost": 2}}})
+    
+    must_clauses = [{"bool": {"should": title_clauses, "minimum_should_match": 1}}]
+    if company:
+        must_clauses.append({"match": {"job_company_name": company.lower()}})
+    must_clauses.append({"bool": {"should": location_clauses, "minimum_should_match": 1}})
+    must_clauses.append({"exists": {"field": "emails"}})
+    
+    return apply_search_exclusions({
+        "query": {"bool": {"must": must_clauses}},
+        "size": max_contacts
+    }, exclusions)
 
-def try_metro_search_optimized(primary_title, similar_titles, company, location_strategy, max_contacts):
-    """Fixed metro search - removes invalid minimum_should_match"""
+def try_composite_search_optimized(primary_title, similar_titles, company, location_strategy, max_contacts, fields=None, exclusions=None):
+    """Metro, locality and similar-title search in one PDL query; yields contacts page by page"""
     try:
-        print(f"Metro search for: {location_strategy['metro_location']}")
+        print(f"Composite search for: {location_strategy['metro_location'] or location_strategy['city']}")
         
-        must_clauses = []
+        elasticsearch_query = build_composite_search_query(
+            primary_title, similar_titles, company, location_strategy, max_contacts, exclusions
+        )
         
-        # Simple job title matching - NO minimum_should_match
+        yield from iter_pdl_search_contacts(elasticsearch_query, f"composite_{location_strategy['matched_metro'] or location_strategy['city']}", fields=fields,
+                                             local_criteria=local_search_criteria(primary_title, company, location_strategy, exclusions=exclusions))
+        
+    except PDLRateLimitError:
+        raise
+    except Exception as e:
+        print(f"Composite search failed: {e}")
+
+def build_metro_search_query(primary_title, company, location_strategy, max_contacts, exclusions=None):
+    """Primary title AND company AND PDL metro area"""
+    must_clauses = []
+    
+    # Simple job title matching - NO minimum_should_match
+    must_clauses.append({
+        "match": {"job_title": primary_title.lower()}
+    })
+    
+    # Company matching
+    if company:
         must_clauses.append({
-            "match": {"job_title": primary_title.lower()}
+            "match": {"job_company_name": company.lower()}
         })
-        
-        # Company matching
-        if company:
-            must_clauses.append({
-                "match": {"job_company_name": company.lower()}
-            })
-        
-        # Metro location matching
+    
+    # Metro location matching
+    must_clauses.append({
+        "match": {"location_metro": location_strategy['metro_location']}
+    })
+    
+    # Required fields
+    must_clauses.append({"exists": {"field": "emails"}})
+    
+    return apply_search_exclusions({
+        "query": {"bool": {"must": must_clauses}},
+        "size": max_contacts
+    }, exclusions)
+
+def build_locality_search_query(primary_title, company, location_strategy, max_contacts, exclusions=None):
+    """Primary title AND company AND city (AND state when known)"""
+    must_clauses = []
+    
+    # Simple job title matching - NO minimum_should_match
+    must_clauses.append({
+        "match": {"job_title": primary_title.lower()}
+    })
+    
+    # Company matching
+    if company:
         must_clauses.append({
-            "match": {"location_metro": location_strategy['metro_location']}
+            "match": {"job_company_name": company.lower()}
         })
+    
+    # Locality matching
+    must_clauses.append({
+        "match": {"location_locality": location_strategy['city'].lower()}
+    })
+    
+    if location_strategy['state']:
+        must_clauses.append({
+            "match": {"location_region": location_strategy['state'].lower()}
+        })
+    
+    # Required fields
+    must_clauses.append({"exists": {"field": "emails"}})
+    
+    return apply_search_exclusions({
+        "query": {"bool": {"must": must_clauses}},
+        "size": max_contacts
+    }, exclusions)
+
+def try_metro_search_optimized(primary_title, similar_titles, company, location_strategy, max_contacts, fields=None, exclusions=None):
+    """Fixed metro search - removes invalid minimum_should_match; yields contacts page by page"""
+    try:
+        print(f"Metro search for: {location_strategy['metro_location']}")
         
-        # Required fields
-        must_clauses.append({"exists": {"field": "emails"}})
-        
-        elasticsearch_query = {
-            "query": {"bool": {"must": must_clauses}},
-            "size": max_contacts
-        }
+        elasticsearch_query = build_metro_search_query(primary_title, company, location_strategy, max_contacts, exclusions)
         
-        return execute_pdl_search(elasticsearch_query, f"metro_{location_strategy['matched_metro']}")
+        yield from iter_pdl_search_contacts(elasticsearch_query, f"metro_{location_strategy['matched_metro']}", fields=fields,
+                                             local_criteria=local_search_criteria(primary_title, company, location_strategy,
+                                                                       locality=False, exclusions=exclusions))
         
+    except PDLRateLimitError:
+        raise
     except Exception as e:
         print(f"Metro search failed: {e}")
-        return []
 
-def try_locality_search_optimized(primary_title, similar_titles, company, location_strategy, max_contacts):
-    """Fixed locality search - removes invalid minimum_should_match"""
+def try_locality_search_optimized(primary_title, similar_titles, company, location_strategy, max_contacts, fields=None, exclusions=None):
+    """Fixed locality search - removes invalid minimum_should_match; yields contacts page by page"""
     try:
         print(f"Locality search for: {location_strategy['city']}, {location_strategy['state']}")
         
-        must_clauses = []
-        
-        # Simple job title matching - NO minimum_should_match
-        must_clauses.append({
-            "match": {"job_title": primary_title.lower()}
-        })
-        
-        # Company matching
-        if company:
-            must_clauses.append({
-                "match": {"job_company_name": company.lower()}
-            })
-        
-        # Locality matching
-        must_clauses.append({
-            "match": {"location_locality": location_strategy['city'].lower()}
-        })
-        
-        if location_strategy['state']:
-            must_clauses.append({
-                "match": {"location_region": location_strategy['state'].lower()}
-            })
-        
-        # Required fields
-        must_clauses.append({"exists": {"field": "emails"}})
-        
-        elasticsearch_query = {
-            "query": {"bool": {"must": must_clauses}},
-            "size": max_contacts
-        }
+        elasticsearch_query = build_locality_search_query(primary_title, company, location_strategy, max_contacts, exclusions)
         
-        return execute_pdl_search(elasticsearch_query, f"locality_{location_strategy['city']}")
+        yield from iter_pdl_search_contacts(elasticsearch_query, f"locality_{location_strategy['city']}", fields=fields,
+                                             local_criteria=local_search_criteria(primary_title, company, location_strategy,
+                                                                       metro=False, exclusions=exclusions))
         
+    except PDLRateLimitError:
+        raise
     except Exception as e:
         print(f"Locality search failed: {e}")
-        return []
 
-def try_job_title_levels_search_enhanced(job_title_enrichment, company, city, state, max_contacts):
-    """Enhanced job title levels search using enriched data"""
+def try_job_title_levels_search_enhanced(job_title_enrichment, company, city, state, max_contacts, fields=None, exclusions=None):
+    """Enhanced job title levels search using enriched data; yields contacts page by page"""
     try:
         print(f"Enhanced job title levels search")
         
@@ -760,12 +2752,14 @@ def try_job_title_levels_search_enhanced(job_title_enrichment, company, city, st
             },
             "size": max_contacts
         }
+        apply_search_exclusions(elasticsearch_query, exclusions)
         
-        return execute_pdl_search(elasticsearch_query, "job_levels_enhanced")
+        yield from iter_pdl_search_contacts(elasticsearch_query, "job_levels_enhanced", fields=fields)
         
+    except PDLRateLimitError:
+        raise
     except Exception as e:
         print(f"Enhanced job title levels search failed: {e}")
-        return []
 
 def determine_job_level(job_title):
     """Determine job level from job title for JOB_TITLE_LEVELS search"""
@@ -784,53 +2778,484 @@ def determine_job_level(job_title):
     else:
         return 'mid'  # Default to mid-level
 
-def execute_pdl_search(elasticsearch_query, search_type):
-    """Execute the actual PDL search and process results"""
+PDL_SEARCH_PAGE_SIZE = int(os.getenv('PDL_SEARCH_PAGE_SIZE', '25'))
+
+search_page_executor = ThreadPoolExecutor(max_workers=PDL_PREREQUISITE_WORKERS, thread_name_prefix='pdl-page')
+
+def local_search_criteria(primary_title, company, location_strategy, metro=True, locality=True, exclusions=None):
+    """PDLPersonStore criteria matching what a metro and/or locality query asks PDL for"""
+    criteria = {'title': primary_title, 'company': company, 'exclusions': exclusions}
+    if metro and location_strategy['metro_location']:
+        criteria['metro'] = location_strategy['metro_location']
+    if locality:
+        criteria['city'] = location_strategy['city']
+        criteria['region'] = location_strategy['state']
+    return criteria
+
+def exclude_person_ids(elasticsearch_query, person_ids, size):
+    """Copy of a query that skips people we already have, asking for size more"""
+    query = copy.deepcopy(elasticsearch_query)
+    query['query']['bool'].setdefault('must_not', []).append({"terms": {"id": sorted(person_ids)}})
+    query['size'] = size
+    return query
+
+def execute_pdl_search(elasticsearch_query, search_type, fields=None, local_criteria=None):
+    """Execute the actual PDL search and process results: every page of iter_pdl_search_contacts"""
+    contacts = []
+    for page in iter_pdl_search_contacts(elasticsearch_query, search_type, fields=fields, local_criteria=local_criteria):
+        contacts.extend(page)
+    return contacts
+
+def iter_pdl_search_contacts(elasticsearch_query, search_type, fields=None, local_criteria=None):
+    """Yield a search's contacts a page at a time, from the cache, the person store or PDL
+    
+    Raw person records are cached by canonical query, so a repeat search skips PDL
+    (and its credits) and only re-runs contact extraction. Concurrent requests for
+    the same query share one upstream call. Requests larger than PDL_SEARCH_PAGE_SIZE
+    are fetched page by page; if a later page fails the earlier pages are kept.
+    With fields, PDL only returns the person data those contact fields need.
+    
+    With local_criteria, fresh matching people from the local person store are used
+    first and PDL is only asked for the remainder, excluding the ids already in hand.
+    Closing the generator early stops any further PDL pages from being requested.
+    """
+    data_include = pdl_data_include_for_fields(fields)
+    cache_key = search_query_cache_key(elasticsearch_query, data_include)
+    cached = pdl_cache.get('person_search', cache_key)
+    if cached:
+        people_data = [] if cached.negative else cached.value.get('data', [])
+        print(f"{search_type.title()} search served from cache ({len(people_data)} people)")
+        yield extract_contacts_from_people(people_data, fields)
+        return
+    
+    local_contacts = []
+    if local_criteria and PDL_PERSON_STORE_ENABLED:
+        wanted = elasticsearch_query.get('size') or PDL_SEARCH_PAGE_SIZE
+        local_people = pdl_person_store.search(local_criteria, data_include, wanted)
+        if local_people:
+            print(f"{search_type.title()} search: {len(local_people)} of {wanted} people from the local store")
+            local_contacts = extract_contacts_from_people(local_people, fields)
+            yield local_contacts
+            if len(local_people) >= wanted:
+                return
+            elasticsearch_query = exclude_person_ids(elasticsearch_query, [p['id'] for p in local_people],
+                                                     wanted - len(local_people))
+            cache_key = search_query_cache_key(elasticsearch_query, data_include)
+            cached = pdl_cache.get('person_search', cache_key)
+            if cached:
+                people_data = [] if cached.negative else cached.value.get('data', [])
+                yield extract_contacts_from_people(people_data, fields)
+                return
+    
     try:
-        query_json = json.dumps(elasticsearch_query)
-        search_params = {
-            'api_key': PEOPLE_DATA_LABS_API_KEY,
-            'query': query_json,
-            'pretty': 'true'
-        }
-        
-        print(f"Executing {search_type} search")
-        
-        response = requests.get(
-            f"{PDL_BASE_URL}/person/search",
-            params=search_params,
-            timeout=15
+        # iter_pdl_search_contacts already missed the cache for this query
+        yield from pdl_singleflight.stream(('person_search', cache_key), iter_pdl_search_pages,
+                                           elasticsearch_query, search_type, fields=fields, check_cache=False)
+    except PDLRateLimitError as e:
+        if not local_contacts:
+            raise
+        print(f"{search_type.title()} search limited to local results: {e}")
+
+PDL_ESTIMATE_PROBE_SIZE = 1
+PDL_ESTIMATE_DEFAULT_SEARCH_LATENCY = float(os.getenv('PDL_ESTIMATE_DEFAULT_SEARCH_LATENCY', '2.0'))
+
+def count_pdl_search_matches(elasticsearch_query, search_type, fields=None):
+    """How many people PDL has for a query: (total, source)
+    
+    source is 'search_cache' when the search itself is cached (running it costs no PDL
+    call), 'count_cache', 'probe', or 'unavailable' when PDL could not answer.
+    
+    Answered from a cached search of the same query when there is one, otherwise from a
+    cached or fresh probe. PDL has no count-only mode, so the probe asks for a single
+    record's id and reads the response's total (at most one credit).
+    """
+    cached = pdl_cache.get('person_search', search_query_cache_key(elasticsearch_query, pdl_data_include_for_fields(fields)))
+    if cached:
+        if cached.negative:
+            return 0, 'search_cache'
+        return cached.value.get('total') or len(cached.value.get('data', [])), 'search_cache'
+    
+    probe_query = dict(elasticsearch_query, size=PDL_ESTIMATE_PROBE_SIZE)
+    cache_key = search_query_cache_key(probe_query, 'id')
+    cached = pdl_cache.get('search_count', cache_key)
+    if cached:
+        return cached.value, 'count_cache'
+    
+    response = None
+    try:
+        response = pdl_client.post(
+            '/person/search',
+            json=dict(probe_query, data_include='id'),
+            timeout=(PDL_CONNECT_TIMEOUT, PDL_SEARCH_READ_TIMEOUT)
+        )
+        if response.status_code == 200:
+            total = response.json().get('total') or 0
+        elif response.status_code == 404:
+            total = 0
+        else:
+            print(f"{search_type.title()} count probe returned {response.status_code}")
+            return None, 'unavailable'
+    except PDLRateLimitError:
+        raise
+    except Exception as e:
+        print(f"{search_type.title()} count probe failed: {e}")
+        return None, 'unavailable'
+    finally:
+        if response is not None:
+            response.close()
+    
+    pdl_cache.set('search_count', cache_key, total, PDL_SEARCH_CACHE_TTL_SECONDS)
+    return total, 'probe'
+
+def estimate_contact_search(job_title, company, location, tier='pro', exclusions=None):
+    """Expected results, PDL calls and latency of a tier search, without running it
+    
+    Plans the search the way search_contacts_with_smart_location_strategy will
+    (plan_search_chain) and counts matches only for the queries that plan sends: its
+    first step, and the fallback only when the first step is expected to come back
+    short. Like the search, each step is answered from the search cache, then the local
+    person store, and only the remainder is counted (cache or probe, one credit).
+    exclusions (SearchExclusions) are the people the user's own search would skip.
+    """
+    tier_config = TIER_CONFIGS[tier]
+    max_contacts = tier_config['max_contacts']
+    fields = tier_config['fields']
+    data_include = pdl_data_include_for_fields(fields)
+    
+    prerequisites = run_search_prerequisites(job_title, company, location)
+    primary_title = prerequisites['enrichment']['cleaned_name']
+    similar_titles = prerequisites['enrichment']['similar_titles'][:3]
+    cleaned_company = prerequisites['company']
+    location_strategy = determine_location_strategy(prerequisites['location'])
+    chain, first_size = plan_search_chain(search_outcome_key(location_strategy, cleaned_company, primary_title),
+                                          location_strategy, max_contacts)
+    
+    queries = {
+        'composite': lambda size: build_composite_search_query(primary_title, similar_titles, cleaned_company,
+                                                               location_strategy, size, exclusions),
+        'metro': lambda size: build_metro_search_query(primary_title, cleaned_company, location_strategy, size, exclusions),
+        'locality': lambda size: build_locality_search_query(primary_title, cleaned_company, location_strategy, size, exclusions)
+    }
+    local_criteria = {
+        'composite': local_search_criteria(primary_title, cleaned_company, location_strategy, exclusions=exclusions),
+        'metro': local_search_criteria(primary_title, cleaned_company, location_strategy, locality=False, exclusions=exclusions),
+        'locality': local_search_criteria(primary_title, cleaned_company, location_strategy, metro=False, exclusions=exclusions)
+    }
+    strategies = {}
+    
+    def estimate_step(name, size):
+        """(expected contacts, upstream calls) for one step of the plan"""
+        if name not in queries:
+            # Job title level matches are not counted up front; assume one call
+            return None, 1
+        query = queries[name](size)
+        local_count = 0
+        if PDL_PERSON_STORE_ENABLED and not pdl_cache.get('person_search', search_query_cache_key(query, data_include)):
+            local_people = pdl_person_store.search(local_criteria[name], data_include, size)
+            local_count = len(local_people)
+            if local_count >= size:
+                expected = min(size, max_contacts)
+                strategies[name] = {'total_matches': None, 'local_matches': local_count,
+                                    'expected_contacts': expected, 'source': 'person_store'}
+                return expected, 0
+            if local_people:
+                query = exclude_person_ids(query, [p['id'] for p in local_people], size - local_count)
+        
+        total, source = count_pdl_search_matches(query, f"{name}_estimate", fields)
+        remaining = size - local_count
+        expected = min(local_count + min(total, remaining), max_contacts) if total is not None else (local_count or None)
+        strategies[name] = {'total_matches': total, 'local_matches': local_count,
+                            'expected_contacts': expected, 'source': source}
+        if source == 'search_cache':
+            return expected, 0
+        return expected, max(1, math.ceil(min(total if total is not None else remaining, remaining) / PDL_SEARCH_PAGE_SIZE))
+    
+    plan = [chain[0]]
+    found, upstream_calls = estimate_step(chain[0], first_size)
+    expected_contacts = found or 0
+    if len(chain) > 1 and expected_contacts < max_contacts // 2:
+        plan.append(chain[1])
+        found, calls = estimate_step(chain[1], max_contacts - expected_contacts)
+        upstream_calls += calls
+        expected_contacts = min(max_contacts, expected_contacts + (found or 0))
+    
+    search_latency = pdl_client.latency.get('search', PDL_ESTIMATE_DEFAULT_SEARCH_LATENCY)
+    return {
+        'tier': tier,
+        'max_contacts': max_contacts,
+        'location_strategy': location_strategy['strategy'],
+        'matched_metro': location_strategy['matched_metro'],
+        'strategies': strategies,
+        'plan': plan,
+        'expected_contacts': expected_contacts,
+        'expected_upstream_calls': upstream_calls,
+        'expected_latency_seconds': round(upstream_calls * search_latency, 2)
+    }
+
+def extract_contacts_from_people(people_data, fields=None):
+    extract = compile_pdl_contact_extractor(frozenset(fields) if fields else None)
+    contacts = []
+    for person in people_data:
+        contact = extract(person)
+        if contact:
+            contacts.append(contact)
+    return contacts
+
+class CompressedJSONArrayWriter:
+    """Builds zlib-compressed {"data": [...], "total": N} incrementally, one record at a time,
+    so caching a search never needs the full list of raw person records in memory"""
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(6)
+        self._chunks = [self._compressor.compress(b'{"data":[')]
+        self.count = 0
+
+    def add(self, record):
+        prefix = b',' if self.count else b''
+        self._chunks.append(self._compressor.compress(prefix + json.dumps(record, separators=(',', ':')).encode('utf-8')))
+        self.count += 1
+
+    def finish(self, total=None):
+        self._chunks.append(self._compressor.compress(b'],"total":' + json.dumps(total).encode('utf-8') + b'}'))
+        self._chunks.append(self._compressor.flush())
+        return b''.join(self._chunks)
+
+class _StreamingJSONReader:
+    """Pull parser over a stream of text chunks, decoding one JSON value at a time"""
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def take(self, expected):
+        char = self.peek()
+        if char not in expected:
+            raise ValueError(f"Malformed PDL response: expected {expected!r}, got {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self.buf, self.pos)
+                # A value ending exactly at the buffer edge may be a truncated number
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+def iter_pdl_search_stream(chunks, meta):
+    """Yield each person from a person/search response body as soon as it is decoded
+    
+    chunks are text fragments of the JSON body; every top-level key other than
+    "data" (status, total, scroll_token, ...) is stored in meta.
+    """
+    reader = _StreamingJSONReader(chunks)
+    reader.take('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        reader.take(':')
+        if key == 'data' and reader.peek() == '[':
+            reader.take('[')
+            if reader.peek() == ']':
+                reader.take(']')
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.take(',]') == ']':
+                        break
+        else:
+            meta[key] = reader.value()
+        if reader.take(',}') == '}':
+            return
+
+def iter_response_text(response, chunk_size=64 * 1024):
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if chunk:
+            yield decoder.decode(chunk)
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+def fetch_pdl_search_page(search_query, search_type, scroll_token=None, data_include=None, fields=None, cache_writer=None):
+    """One person/search request, parsed as it streams in
+    
+    The query goes in a POST body: exclusion lists can make it far longer than a URL may be.
+    Each person is handed to the extractor as soon as it is decoded (and appended to
+    cache_writer, compressed, and to the person store in small batches), so only
+    extracted contacts are held in memory.
+    Returns (status_code, page) where page has contacts, count, total and scroll_token;
+    page is None on failure.
+    """
+    response = None
+    try:
+        search_body = dict(search_query)
+        if scroll_token:
+            search_body['scroll_token'] = scroll_token
+        if data_include:
+            search_body['data_include'] = data_include
+        
+        print(f"Executing {search_type} search{' (next page)' if scroll_token else ''}")
+        
+        response = pdl_client.post(
+            '/person/search',
+            json=search_body,
+            timeout=(PDL_CONNECT_TIMEOUT, PDL_SEARCH_READ_TIMEOUT),
+            stream=True
         )
         
         print(f"{search_type.title()} search response: {response.status_code}")
         
         if response.status_code == 200:
-            search_data = response.json()
-            
-            if search_data.get('status') == 200 and search_data.get('data'):
-                people_data = search_data['data']
-                print(f"{search_type.title()} search found {len(people_data)} people")
-                
-                contacts = []
-                for person in people_data:
-                    contact = extract_contact_from_pdl_person_enhanced(person)
-                    if contact:
-                        contacts.append(contact)
-                
-                return contacts
+            meta = {}
+            contacts = []
+            store_batch = []
+            store_batch_size = max(1, min(PDL_PERSON_STORE_BATCH_SIZE, PDL_SEARCH_PAGE_SIZE // 4))
+            unversioned_ids = []
+            count = 0
+            extract = compile_pdl_contact_extractor(frozenset(fields) if fields else None)
+            for person in iter_pdl_search_stream(iter_response_text(response), meta):
+                count += 1
+                if cache_writer is not None:
+                    cache_writer.add(person)
+                if PDL_PERSON_STORE_ENABLED:
+                    store_batch.append(person)
+                    if len(store_batch) >= store_batch_size:
+                        pdl_person_store.add_many(store_batch, data_include, meta.get('dataset_version'))
+                        if not meta.get('dataset_version'):
+                            unversioned_ids.extend(p.get('id') for p in store_batch if isinstance(p, dict) and p.get('id'))
+                        store_batch = []
+                contact = extract(person)
+                if contact:
+                    contacts.append(contact)
+            if store_batch:
+                pdl_person_store.add_many(store_batch, data_include, meta.get('dataset_version'))
+            pdl_person_store.set_dataset_version(unversioned_ids, meta.get('dataset_version'))
+            if meta.get('status') == 200:
+                return 200, {
+                    'contacts': contacts,
+                    'count': count,
+                    'total': meta.get('total'),
+                    'scroll_token': meta.get('scroll_token')
+                }
         
+        elif response.status_code == 404:
+            print(f"{search_type.title()} search found no matching records")
         elif response.status_code == 402:
             print(f"PDL API: Payment required for {search_type} search")
-        elif response.status_code == 429:
-            print(f"PDL API rate limited for {search_type} search")
         else:
             print(f"{search_type.title()} search error {response.status_code}: {response.text}")
         
-        return []
+        return response.status_code, None
         
+    except PDLRateLimitError:
+        raise
     except Exception as e:
         print(f"{search_type.title()} search execution failed: {e}")
-        return []
+        return None, None
+    finally:
+        if response is not None:
+            response.close()
+
+def iter_pdl_search_pages(elasticsearch_query, search_type, page_size=None, fields=None, check_cache=True):
+    """Yield extracted contacts one PDL page at a time, following scroll_token
+    
+    The next page is requested in the background while the caller works on the
+    current one, and cancelled if the caller closes the generator first. A failed
+    page ends iteration without discarding pages already yielded; only a fully
+    fetched result set is written to the search cache.
+    """
+    page_size = page_size or PDL_SEARCH_PAGE_SIZE
+    wanted = elasticsearch_query.get('size') or page_size
+    data_include = pdl_data_include_for_fields(fields)
+    cache_key = search_query_cache_key(elasticsearch_query, data_include)
+    
+    cached = pdl_cache.get('person_search', cache_key) if check_cache else None
+    if cached:
+        people_data = [] if cached.negative else cached.value.get('data', [])
+        print(f"{search_type.title()} search served from cache ({len(people_data)} people)")
+        for start in range(0, len(people_data), page_size):
+            yield extract_contacts_from_people(people_data[start:start + page_size], fields)
+        return
+    
+    cache_writer = CompressedJSONArrayWriter()
+    total = None
+    complete = False
+    yielded = False
+    
+    def submit_page(size, scroll_token=None):
+        page_query = dict(elasticsearch_query, size=size)
+        return search_page_executor.submit(fetch_pdl_search_page, page_query, search_type, scroll_token,
+                                           data_include, fields, cache_writer)
+    
+    future = submit_page(min(page_size, wanted))
+    try:
+        while future is not None:
+            try:
+                status_code, page = future.result()
+            except PDLRateLimitError as e:
+                # Out of PDL capacity mid-search: keep the pages already delivered
+                if not yielded:
+                    raise
+                print(f"{search_type.title()} search stopped early: {e}")
+                break
+            future = None
+            
+            if page is None:
+                # Nothing matched at all: remember briefly so repeats don't round-trip
+                if status_code == 404 and not cache_writer.count:
+                    pdl_cache.set_negative('person_search', cache_key, PDL_SEARCH_NEGATIVE_TTL_SECONDS)
+                break
+            
+            requested = min(page_size, wanted - (cache_writer.count - page['count']))
+            total = page['total'] if page['total'] is not None else total
+            print(f"{search_type.title()} search found {page['count']} people ({cache_writer.count}/{wanted})")
+            
+            remaining = wanted - cache_writer.count
+            if remaining > 0 and page['scroll_token'] and page['count'] >= requested:
+                future = submit_page(min(page_size, remaining), page['scroll_token'])
+            else:
+                complete = True
+            
+            if page['contacts']:
+                yielded = True
+                yield page['contacts']
+    finally:
+        # The caller stopped early: don't spend credits on a page nobody will read
+        # (a page already in flight still completes, but nothing follows it)
+        if future is not None and future.cancel():
+            print(f"{search_type.title()} search abandoned, next page not requested")
+    
+    if complete and cache_writer.count:
+        pdl_cache.set_compressed('person_search', cache_key, cache_writer.finish(total), PDL_SEARCH_CACHE_TTL_SECONDS)
+
 def extract_hometown_from_education_history_enhanced(education_history):
     """Extract hometown from contact's education history using OpenAI with your exact prompt"""
     try:
@@ -848,11 +3273,11 @@ Education History:
 {education_history}
 """
         
-        response = client.chat.completions.create(
+        response = coalesced_chat_completion(
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": prompt}],
             max_tokens=50,
-            temperature=0.3
+            temperature=0
         )
         
         hometown = response.choices[0].message.content.strip()
@@ -872,204 +3297,237 @@ Education History:
         print(f"Hometown extraction failed: {e}")
         return "Unknown"
 
-def extract_contact_from_pdl_person_enhanced(person):
-    """Enhanced contact extraction with detailed work experience, volunteer work, and education"""
-    try:
-        # Basic info
-        first_name = person.get('first_name', '')
-        last_name = person.get('last_name', '')
-        
-        if not first_name or not last_name:
-            return None
-        
-        # Get detailed work experience from experience array
-        experience = person.get('experience', [])
-        work_experience_details = []
-        current_job = None
-        
-        if isinstance(experience, list) and experience:
-            # Current job (first in array)
-            current_job = experience[0]
-            
-            # Build detailed work experience
-            for i, job in enumerate(experience[:5]):  # Top 5 experiences
-                if isinstance(job, dict):
-                    company_info = job.get('company', {})
-                    title_info = job.get('title', {})
-                    
-                    company_name = company_info.get('name', '') if isinstance(company_info, dict) else ''
-                    job_title = title_info.get('name', '') if isinstance(title_info, dict) else ''
-                    
-                    start_date = job.get('start_date', {})
-                    end_date = job.get('end_date', {})
-                    
-                    # Format dates
-                    start_str = ""
-                    end_str = ""
-                    if isinstance(start_date, dict):
-                        start_year = start_date.get('year')
-                        start_month = start_date.get('month')
-                        if start_year:
-                            start_str = f"{start_month or 1}/{start_year}" if start_month else str(start_year)
-                    
-                    if isinstance(end_date, dict):
-                        end_year = end_date.get('year')
-                        end_month = end_date.get('month')
-                        if end_year:
-                            end_str = f"{end_month or 12}/{end_year}" if end_month else str(end_year)
-                    elif i == 0:  # Current job
-                        end_str = "Present"
-                    
-                    # Build experience entry
-                    if company_name and job_title:
-                        duration = f"{start_str} - {end_str}" if start_str else "Date unknown"
-                        work_experience_details.append(f"{job_title} at {company_name} ({duration})")
-        
-        # Extract current job details
-        company_name = ''
-        job_title = ''
-        if current_job:
-            company_info = current_job.get('company', {})
-            title_info = current_job.get('title', {})
+# Volunteer signals: any of these in an interest, or a summary sentence containing one of the summary keywords
+VOLUNTEER_INTEREST_PATTERN = re.compile('volunteer|charity|nonprofit|community|outreach|mentor')
+VOLUNTEER_SUMMARY_KEYWORDS = ('volunteer', 'charity', 'nonprofit', 'community service', 'mentor', 'coach')
+
+def _pdl_name(info):
+    return info.get('name', '') if isinstance(info, dict) else ''
+
+def _pdl_current_job(person):
+    experience = person.get('experience', [])
+    current_job = experience[0] if isinstance(experience, list) and experience else None
+    if current_job:
+        return _pdl_name(current_job.get('company', {})), _pdl_name(current_job.get('title', {}))
+    return '', ''
+
+def _pdl_job_fields(person):
+    company_name, job_title = _pdl_current_job(person)
+    return job_title, company_name, f"{company_name} {job_title.split()[0] if job_title else 'Professional'} Team"
+
+def _pdl_work_summary(person):
+    experience = person.get('experience', [])
+    work_experience_details = []
+    if isinstance(experience, list):
+        for i, job in enumerate(experience[:5]):  # Top 5 experiences
+            if not isinstance(job, dict):
+                continue
+            company_info = job.get('company')
+            title_info = job.get('title')
             company_name = company_info.get('name', '') if isinstance(company_info, dict) else ''
             job_title = title_info.get('name', '') if isinstance(title_info, dict) else ''
-        
-        # Get location using correct field structure
-        location_info = person.get('location', {})
-        city = location_info.get('locality', '') if isinstance(location_info, dict) else ''
-        state = location_info.get('region', '') if isinstance(location_info, dict) else ''
-        
-        # Enhanced email extraction
-        primary_email = person.get('recommended_personal_email', '')
-        emails = person.get('emails', [])
-        personal_email = ''
-        work_email = ''
-        
-        if isinstance(emails, list) and emails:
-            for email in emails:
-                if isinstance(email, dict):
-                    email_address = email.get('address', '')
-                    email_type = email.get('type', '')
-                    
-                    if email_type == 'work':
-                        work_email = email_address
-                    elif email_type == 'personal':
-                        personal_email = email_address
-        
-        if not primary_email:
-            primary_email = personal_email or work_email
-        
-        # Get phone
-        phone_numbers = person.get('phone_numbers', [])
-        phone = phone_numbers[0] if isinstance(phone_numbers, list) and phone_numbers else ''
-        
-        # Get LinkedIn
-        profiles = person.get('profiles', [])
-        linkedin_url = ''
-        
-        if isinstance(profiles, list):
-            for profile in profiles:
-                if isinstance(profile, dict) and 'linkedin' in profile.get('network', '').lower():
-                    linkedin_url = profile.get('url', '')
-                    break
-        
-        # Enhanced education extraction with detailed history
-        education = person.get('education', [])
-        education_details = []
-        college_name = ""
-        
-        if isinstance(education, list):
-            for edu in education:
-                if isinstance(edu, dict):
-                    school_info = edu.get('school', {})
-                    if isinstance(school_info, dict):
-                        school_name = school_info.get('name', '')
-                        degrees = edu.get('degrees', [])
-                        degree = degrees[0] if isinstance(degrees, list) and degrees else ''
-                        
-                        # Get education dates
-                        start_date = edu.get('start_date', {})
-                        end_date = edu.get('end_date', {})
-                        
-                        start_year = start_date.get('year') if isinstance(start_date, dict) else None
-                        end_year = end_date.get('year') if isinstance(end_date, dict) else None
-                        
-                        if school_name:
-                            # Build education entry
-                            edu_entry = school_name
-                            if degree:
-                                edu_entry += f" - {degree}"
-                            if start_year or end_year:
-                                years = f"({start_year or '?'} - {end_year or 'Present'})"
-                                edu_entry += f" {years}"
-                            
-                            education_details.append(edu_entry)
-                            
-                            # Set college name (usually the first/most recent)
-                            if not college_name and 'high school' not in school_name.lower():
-                                college_name = school_name
-        
-        education_history = '; '.join(education_details) if education_details else 'Not available'
-        
-        # Enhanced volunteer work extraction from interests and other sources
-        volunteer_work = []
-        
-        # From interests (enhanced extraction)
-        interests = person.get('interests', [])
-        if isinstance(interests, list) and interests:
-            for interest in interests:
-                if isinstance(interest, str):
-                    # Look for volunteer-related keywords
-                    if any(word in interest.lower() for word in ['volunteer', 'charity', 'nonprofit', 'community', 'outreach', 'mentor']):
-                        volunteer_work.append(interest)
-                    elif len(volunteer_work) < 3:  # Add general interests as potential volunteer areas
-                        volunteer_work.append(f"{interest} enthusiast")
-        
-        # From summary or bio if available
-        summary = person.get('summary', '')
-        if summary and isinstance(summary, str):
-            # Look for volunteer mentions in summary
-            volunteer_keywords = ['volunteer', 'charity', 'nonprofit', 'community service', 'mentor', 'coach']
-            summary_lower = summary.lower()
-            for keyword in volunteer_keywords:
-                if keyword in summary_lower:
-                    # Try to extract context around the keyword
-                    sentences = summary.split('.')
-                    for sentence in sentences:
-                        if keyword in sentence.lower():
-                            volunteer_work.append(sentence.strip())
-                            break
-        
-        volunteer_history = '; '.join(volunteer_work[:5]) if volunteer_work else 'Not available'  # Limit to 5 entries
-        
-        # Build enhanced contact object
-        contact = {
-            'FirstName': first_name,
-            'LastName': last_name,
-            'LinkedIn': linkedin_url,
-            'Email': primary_email,
-            'Title': job_title,
-            'Company': company_name,
-            'City': city,
-            'State': state,
-            'College': college_name,
-            'Phone': phone,
-            'PersonalEmail': person.get('recommended_personal_email', personal_email),
-            'WorkEmail': work_email or 'Not available',
-            'SocialProfiles': f'LinkedIn: {linkedin_url}' if linkedin_url else 'Not available',
-            'EducationTop': education_history,  # Now contains full education history
-            'VolunteerHistory': volunteer_history,  # Enhanced volunteer work
-            'WorkSummary': '; '.join(work_experience_details[:3]) if work_experience_details else f"Professional at {company_name}",  # Detailed work experience
-            'Group': f"{company_name} {job_title.split()[0] if job_title else 'Professional'} Team",
-            'LinkedInConnections': person.get('linkedin_connections', 0),
-            'DataVersion': person.get('dataset_version', 'Unknown')
-        }
-        
-        return contact
-        
-    except Exception as e:
-        print(f"Failed to extract enhanced contact: {e}")
-        return None
+            if not (company_name and job_title):
+                continue
+            
+            start_str = ''
+            start_date = job.get('start_date', {})
+            if isinstance(start_date, dict):
+                start_year = start_date.get('year')
+                if start_year:
+                    start_month = start_date.get('month')
+                    start_str = f"{start_month}/{start_year}" if start_month else str(start_year)
+            
+            end_str = ''
+            end_date = job.get('end_date', {})
+            if isinstance(end_date, dict):
+                end_year = end_date.get('year')
+                if end_year:
+                    end_month = end_date.get('month')
+                    end_str = f"{end_month}/{end_year}" if end_month else str(end_year)
+            elif i == 0:  # Current job
+                end_str = "Present"
+            
+            duration = f"{start_str} - {end_str}" if start_str else "Date unknown"
+            work_experience_details.append(f"{job_title} at {company_name} ({duration})")
+            if len(work_experience_details) == 3:
+                break
+    
+    if work_experience_details:
+        return ('; '.join(work_experience_details),)
+    return (f"Professional at {_pdl_current_job(person)[0]}",)
+
+def _pdl_location_fields(person):
+    location_info = person.get('location')
+    if isinstance(location_info, dict):
+        return location_info.get('locality', ''), location_info.get('region', '')
+    return person.get('location_locality') or '', person.get('location_region') or ''
+
+def _pdl_email_fields(person):
+    personal_email = ''
+    work_email = ''
+    emails = person.get('emails', [])
+    if isinstance(emails, list):
+        for email in emails:
+            if isinstance(email, dict):
+                email_type = email.get('type', '')
+                if email_type == 'work':
+                    work_email = email.get('address', '')
+                elif email_type == 'personal':
+                    personal_email = email.get('address', '')
+    
+    return (
+        person.get('recommended_personal_email', '') or personal_email or work_email,
+        person.get('recommended_personal_email', personal_email),
+        work_email or 'Not available'
+    )
+
+def _pdl_phone_fields(person):
+    phone_numbers = person.get('phone_numbers', [])
+    return (phone_numbers[0] if isinstance(phone_numbers, list) and phone_numbers else '',)
+
+def _pdl_profile_fields(person):
+    linkedin_url = ''
+    profiles = person.get('profiles', [])
+    if isinstance(profiles, list):
+        for profile in profiles:
+            if isinstance(profile, dict) and 'linkedin' in profile.get('network', '').lower():
+                linkedin_url = profile.get('url', '')
+                break
+    return linkedin_url, f'LinkedIn: {linkedin_url}' if linkedin_url else 'Not available'
+
+def _pdl_education_fields(person, college_only=False):
+    education_details = []
+    college_name = ''
+    education = person.get('education', [])
+    if isinstance(education, list):
+        for edu in education:
+            if college_name and college_only:
+                break
+            if not isinstance(edu, dict):
+                continue
+            school_info = edu.get('school', {})
+            if not isinstance(school_info, dict):
+                continue
+            school_name = school_info.get('name', '')
+            if not school_name:
+                continue
+            
+            edu_entry = school_name
+            degrees = edu.get('degrees', [])
+            if isinstance(degrees, list) and degrees and degrees[0]:
+                edu_entry += f" - {degrees[0]}"
+            start_date = edu.get('start_date', {})
+            end_date = edu.get('end_date', {})
+            start_year = start_date.get('year') if isinstance(start_date, dict) else None
+            end_year = end_date.get('year') if isinstance(end_date, dict) else None
+            if start_year or end_year:
+                edu_entry += f" ({start_year or '?'} - {end_year or 'Present'})"
+            education_details.append(edu_entry)
+            
+            # College is the first (usually most recent) school that isn't a high school
+            if not college_name and 'high school' not in school_name.lower():
+                college_name = school_name
+    
+    return college_name, '; '.join(education_details) if education_details else 'Not available'
+
+def _pdl_volunteer_fields(person):
+    volunteer_work = []
+    
+    interests = person.get('interests', [])
+    if isinstance(interests, list):
+        for interest in interests:
+            if isinstance(interest, str):
+                if VOLUNTEER_INTEREST_PATTERN.search(interest.lower()):
+                    volunteer_work.append(interest)
+                elif len(volunteer_work) < 3:  # Add general interests as potential volunteer areas
+                    volunteer_work.append(f"{interest} enthusiast")
+    
+    summary = person.get('summary', '')
+    if summary and isinstance(summary, str):
+        summary_lower = summary.lower()
+        sentences = None
+        for keyword in VOLUNTEER_SUMMARY_KEYWORDS:
+            if keyword in summary_lower:
+                # Split into sentences once, on the first keyword hit
+                if sentences is None:
+                    sentences = [(sentence, sentence.lower()) for sentence in summary.split('.')]
+                for sentence, sentence_lower in sentences:
+                    if keyword in sentence_lower:
+                        volunteer_work.append(sentence.strip())
+                        break
+    
+    return ('; '.join(volunteer_work[:5]) if volunteer_work else 'Not available',)  # Limit to 5 entries
+
+# Contact field spec: (fields produced, extractor returning their values in that order, fields that
+# trigger the step). None triggers on any produced field; () always runs, as the job step must
+# because a malformed current job rejects the whole person. The full education walk only runs
+# for EducationTop; College alone stops at the first college like the original extractor.
+PDL_CONTACT_FIELD_SPEC = (
+    (('Title', 'Company', 'Group'), _pdl_job_fields, ()),
+    (('LinkedIn', 'SocialProfiles'), _pdl_profile_fields, None),
+    (('Email', 'PersonalEmail', 'WorkEmail'), _pdl_email_fields, None),
+    (('City', 'State'), _pdl_location_fields, None),
+    (('College', 'EducationTop'), _pdl_education_fields, ('EducationTop',)),
+    (('College',), lambda person: _pdl_education_fields(person, college_only=True)[:1], None),
+    (('Phone',), _pdl_phone_fields, None),
+    (('WorkSummary',), _pdl_work_summary, None),
+    (('VolunteerHistory',), _pdl_volunteer_fields, None),
+    (('LinkedInConnections',), lambda person: (person.get('linkedin_connections', 0),), None),
+    (('DataVersion',), lambda person: (person.get('dataset_version', 'Unknown'),), None),
+)
+
+@functools.lru_cache(maxsize=64)
+def compile_pdl_contact_extractor(fields=None):
+    """Build an extractor from PDL_CONTACT_FIELD_SPEC for a frozenset of contact fields (None = all)
+    
+    Steps that produce no wanted field are dropped up front, and each kept step is paired
+    with the (position, slot setter) of the values it fills, so per-person work is a
+    plain loop of calls and slot stores.
+    """
+    want = (lambda field: True) if fields is None else fields.__contains__
+    steps = []
+    covered = set()
+    for outputs, extractor, triggers in PDL_CONTACT_FIELD_SPEC:
+        triggers = outputs if triggers is None else triggers
+        # A field already produced by an earlier step (College from the full education walk) is not redone
+        wanted = [field for field in outputs if want(field) and field not in covered]
+        if triggers and not (wanted and any(want(field) for field in triggers)):
+            continue
+        covered.update(wanted)
+        steps.append((extractor, tuple((outputs.index(field), getattr(Contact, field).__set__) for field in wanted)))
+    steps = tuple(steps)
+    
+    def extract(person):
+        try:
+            first_name = person.get('first_name', '')
+            last_name = person.get('last_name', '')
+            if not first_name or not last_name:
+                return None
+            contact = object.__new__(Contact)
+            contact._extra = None
+            contact.FirstName = first_name
+            contact.LastName = last_name
+            # Kept for every field set: search dedupe keys on it and tier output never includes it
+            pdl_id = person.get('id')
+            if pdl_id:
+                contact.PdlId = pdl_id
+            for extractor, slots in steps:
+                values = extractor(person)
+                for position, set_slot in slots:
+                    set_slot(contact, values[position])
+            return contact
+        except Exception as e:
+            print(f"Failed to extract enhanced contact: {e}")
+            return None
+    
+    return extract
+
+def extract_contact_from_pdl_person_enhanced(person, fields=None):
+    """Enhanced contact extraction with detailed work experience, volunteer work, and education
+    
+    When fields is given, only those contact fields (plus the name) are built and returned.
+    """
+    return compile_pdl_contact_extractor(frozenset(fields) if fields else None)(person)
 
 def add_pdl_enrichment_fields_optimized(contact, person_data):
     """Add enrichment fields based on your product specifications"""
@@ -1124,9 +3582,10 @@ def add_pdl_enrichment_fields_optimized(contact, person_data):
         print(f"Error adding enrichment fields: {e}")
 
 # Update the main search wrapper
-def search_contacts_with_pdl_optimized(job_title, company, location, max_contacts=8):
+def search_contacts_with_pdl_optimized(job_title, company, location, max_contacts=8, fields=None, exclusions=None):
     """Updated main search function using smart location strategy"""
-    return search_contacts_with_smart_location_strategy(job_title, company, location, max_contacts)
+    return search_contacts_with_smart_location_strategy(job_title, company, location, max_contacts,
+                                                        fields=fields, exclusions=exclusions)
 
 # ========================================
 # NEW INTERESTING EMAIL GENERATION SYSTEM
@@ -1163,38 +3622,140 @@ def find_mutual_interests_and_hooks(user_info, contact, resume_text=None):
         print(f"Error finding mutual interests: {e}")
         return []
 
+# Resume section headings; a section runs to a blank line, a newline starting a new line of text, or the end
+RESUME_SECTION_HEADS = {
+    'interests': re.compile(r'interests?[:\-\s]+', re.IGNORECASE),
+    'hobbies': re.compile(r'hobbies[:\-\s]+', re.IGNORECASE),
+    'activities': re.compile(r'activities[:\-\s]+', re.IGNORECASE),
+    'volunteer': re.compile(r'volunteer[:\-\s]+', re.IGNORECASE),
+    'extracurricular': re.compile(r'extracurricular[:\-\s]+', re.IGNORECASE)
+}
+RESUME_SECTION_BREAK = re.compile(r'\n(?=\n|[A-Z])', re.IGNORECASE)
+# Project mentions run to the end of the sentence or line; only the first 3 per keyword are used
+RESUME_PROJECT_PATTERNS = {
+    keyword: re.compile(rf'{keyword}[:\s]+([^.\n]+)', re.IGNORECASE)
+    for keyword in ('project', 'built', 'created', 'developed', 'designed')
+}
+RESUME_PROJECTS_PER_KEYWORD = 3
+# One pass finds every keyword stem; the full heading/project regex then confirms each hit
+RESUME_KEYWORDS = re.compile(
+    '(?=' + '|'.join(f"(?P<{name}>{name.removesuffix('s')})" for name in (*RESUME_SECTION_HEADS, *RESUME_PROJECT_PATTERNS)) + ')',
+    re.IGNORECASE
+)
+RESUME_UNIVERSITY_OF = re.compile(r'University of ([^,\n]+)', re.IGNORECASE)
+RESUME_SCHOOL_SUFFIXES = [re.compile(suffix, re.IGNORECASE) for suffix in (' University', ' College', ' Institute')]
+
+ResumeSections = namedtuple('ResumeSections', [
+    'interests', 'hobbies', 'activities', 'volunteer', 'extracurricular', 'projects', 'university'
+])
+
+def _resume_section_bodies(text, head, starts, breaks):
+    """Bodies of every non-overlapping `head(.*?)(?:\\n\\n|\\n[A-Z]|$)` section (DOTALL), found by lookup
+    
+    breaks holds every position where the section terminator can match, ending with len(text),
+    so each section's end is a bisect instead of a character-by-character lazy scan.
+    """
+    bodies = []
+    resume_at = 0
+    for start in starts:
+        if start < resume_at:
+            continue
+        match = head.match(text, start)
+        if not match:
+            continue
+        body_start = match.end()
+        end = breaks[bisect.bisect_left(breaks, body_start)]
+        bodies.append(text[body_start:end])
+        # \n\n and \n<letter> are consumed; $ (end, or before a final newline) is not
+        resume_at = end + 2 if text.startswith('\n', end) and end + 1 < len(text) else end
+    return tuple(bodies)
+
+def _resume_project_mentions(text, pattern, starts):
+    """First RESUME_PROJECTS_PER_KEYWORD non-overlapping matches of a project pattern, tried only at keyword hits"""
+    mentions = []
+    resume_at = 0
+    for start in starts:
+        if start < resume_at:
+            continue
+        match = pattern.match(text, start)
+        if match:
+            mentions.append(match.group(1))
+            if len(mentions) == RESUME_PROJECTS_PER_KEYWORD:
+                break
+            resume_at = match.end()
+    return tuple(mentions)
+
+def _resume_school_with_suffix(text, suffix):
+    """re.search(r'([^,\\n]+ University)', text, re.I).group(1) in linear time
+    
+    The regex retries every start position and backtracks across the whole line each time.
+    Its match starts at the first comma/newline-delimited segment holding the suffix after
+    at least one character, and (greedy) ends at that segment's last occurrence of it.
+    """
+    first = None
+    for match in suffix.finditer(text):
+        if first is None:
+            if match.start() == 0 or text[match.start() - 1] in ',\n':
+                continue
+            first = match
+            segment_start = max(text.rfind(',', 0, match.start()), text.rfind('\n', 0, match.start())) + 1
+            segment_end = min(position for position in (text.find(',', match.start()), text.find('\n', match.start()), len(text)) if position >= 0)
+            last = match
+        elif match.start() < segment_end:
+            last = match
+        else:
+            break
+    if first is None:
+        return None
+    return text[segment_start:last.end()]
+
+@functools.lru_cache(maxsize=64)
+def segment_resume(resume_text):
+    """Split a resume into the sections the extractors read, in one keyword pass
+    
+    Cached by resume content, since the same resume is mined for every contact in a batch.
+    Each field matches what the original per-pattern regex scans returned.
+    """
+    starts = {name: [] for name in RESUME_KEYWORDS.groupindex}
+    for match in RESUME_KEYWORDS.finditer(resume_text):
+        starts[match.lastgroup].append(match.start())
+    
+    breaks = [match.start() for match in RESUME_SECTION_BREAK.finditer(resume_text)]
+    if resume_text.endswith('\n'):
+        breaks.append(len(resume_text) - 1)
+    breaks.append(len(resume_text))
+    
+    sections = {name: _resume_section_bodies(resume_text, head, starts[name], breaks) for name, head in RESUME_SECTION_HEADS.items()}
+    projects = tuple((keyword, _resume_project_mentions(resume_text, pattern, starts[keyword]))
+                     for keyword, pattern in RESUME_PROJECT_PATTERNS.items())
+    
+    university = RESUME_UNIVERSITY_OF.search(resume_text)
+    if university:
+        university = university.group(1)
+    else:
+        university = next(filter(None, (_resume_school_with_suffix(resume_text, suffix) for suffix in RESUME_SCHOOL_SUFFIXES)), None)
+    
+    return ResumeSections(projects=projects, university=university, **sections)
+
 def extract_interests_from_resume(resume_text):
     """Extract interests, hobbies, and activities from resume"""
     try:
         if not resume_text or len(resume_text.strip()) < 50:
             return []
         
+        sections = segment_resume(resume_text)
+        
         # Look for interests section
         interests = []
-        resume_lower = resume_text.lower()
-        
-        # Common interest indicators
-        interest_patterns = [
-            r'interests?[:\-\s]+(.*?)(?:\n\n|\n[A-Z]|$)',
-            r'hobbies[:\-\s]+(.*?)(?:\n\n|\n[A-Z]|$)',
-            r'activities[:\-\s]+(.*?)(?:\n\n|\n[A-Z]|$)',
-            r'volunteer[:\-\s]+(.*?)(?:\n\n|\n[A-Z]|$)',
-            r'extracurricular[:\-\s]+(.*?)(?:\n\n|\n[A-Z]|$)'
-        ]
-        
-        for pattern in interest_patterns:
-            matches = re.findall(pattern, resume_text, re.IGNORECASE | re.DOTALL)
+        for matches in (sections.interests, sections.hobbies, sections.activities, sections.volunteer, sections.extracurricular):
             for match in matches:
                 # Clean and split interests
                 clean_interests = [i.strip() for i in re.split(r'[,;•\-\n]', match) if i.strip() and len(i.strip()) > 2]
                 interests.extend(clean_interests[:5])  # Limit to 5 per category
         
         # Also look for projects that might indicate interests
-        project_keywords = ['project', 'built', 'created', 'developed', 'designed']
-        for keyword in project_keywords:
-            pattern = rf'{keyword}[:\s]+([^.\n]+)'
-            matches = re.findall(pattern, resume_text, re.IGNORECASE)
-            for match in matches[:3]:  # Top 3 projects
+        for keyword, matches in sections.projects:
+            for match in matches:  # Top 3 projects
                 if len(match.strip()) > 10:
                     interests.append(f"Project: {match.strip()[:50]}")
         
@@ -1283,28 +3844,74 @@ def extract_field_from_title(title):
     else:
         return 'their field'
 
+# Pairs scoring at or below this Jaccard similarity are not overlaps
+INTEREST_SIMILARITY_THRESHOLD = 0.3
+
+@functools.lru_cache(maxsize=4096)
+def interest_tokens(interest):
+    """Lowercased word set of an interest, the unit calculate_interest_similarity compares"""
+    return frozenset(interest.lower().split())
+
+class InterestIndex:
+    """A user's interests tokenized once, with an inverted index from word to interest positions"""
+
+    def __init__(self, interests):
+        self.interests = interests
+        self.tokens = [interest_tokens(interest) for interest in interests]
+        self.postings = {}
+        for position, tokens in enumerate(self.tokens):
+            for token in tokens:
+                self.postings.setdefault(token, []).append(position)
+
+    def matches(self, contact_interest):
+        """(similarity, user position) for every user interest sharing a word with contact_interest"""
+        contact_tokens = interest_tokens(contact_interest)
+        shared = {}
+        for token in contact_tokens:
+            for position in self.postings.get(token, ()):
+                shared[position] = shared.get(position, 0) + 1
+        # Jaccard from the shared-word count: |A & B| / (|A| + |B| - |A & B|)
+        return [(count / (len(self.tokens[position]) + len(contact_tokens) - count), position)
+                for position, count in shared.items()]
+
+# The same user interests are matched against every contact of a run
+build_interest_index = functools.lru_cache(maxsize=32)(InterestIndex)
+
 def find_interest_overlaps(user_interests, contact_interests):
-    """Find overlapping interests between user and contact"""
-    overlaps = []
+    """Find overlapping interests between user and contact
     
-    for user_int in user_interests:
-        for contact_int in contact_interests:
-            similarity_score = calculate_interest_similarity(user_int, contact_int)
-            if similarity_score > 0.3:  # Threshold for similarity
-                overlaps.append({
-                    'user_interest': user_int,
-                    'contact_interest': contact_int,
-                    'similarity': similarity_score,
-                    'overlap_type': determine_overlap_type(user_int, contact_int)
-                })
+    Only pairs sharing at least one word are scored (any other pair has similarity 0),
+    via an inverted index over the user's interests. Same results and order as scoring
+    every pair with calculate_interest_similarity.
+    """
+    if not user_interests or not contact_interests:
+        return []
+    index = build_interest_index(tuple(user_interests))
+    
+    scored = []
+    for contact_position, contact_int in enumerate(contact_interests):
+        for similarity_score, user_position in index.matches(contact_int):
+            if similarity_score > INTEREST_SIMILARITY_THRESHOLD:
+                scored.append((-similarity_score, user_position, contact_position))
     
-    # Sort by similarity score
-    return sorted(overlaps, key=lambda x: x['similarity'], reverse=True)
+    # Highest similarity first, ties in user-interest then contact-interest order
+    scored.sort()
+    overlaps = []
+    for negative_score, user_position, contact_position in scored:
+        user_int = index.interests[user_position]
+        contact_int = contact_interests[contact_position]
+        overlaps.append({
+            'user_interest': user_int,
+            'contact_interest': contact_int,
+            'similarity': -negative_score,
+            'overlap_type': determine_overlap_type(user_int, contact_int)
+        })
+    return overlaps
 
 def calculate_interest_similarity(user_int, contact_int):
     """Calculate similarity between two interests"""
-    user_words = set(user_int.lower().split())
-    contact_words = set(contact_int.lower().split())
+    user_words = interest_tokens(user_int)
+    contact_words = interest_tokens(contact_int)
     
     # Jaccard similarity
     intersection = len(user_words.intersection(contact_words))
@@ -1700,14 +4307,14 @@ Resume text:
 {clean_text}
 """
         
-        response = client.chat.completions.create(
+        response = coalesced_chat_completion(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are an expert at extracting structured information from resumes. Return only valid JSON with no extra text."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=300,
-            temperature=0.3
+            temperature=0
         )
         
         response_text = response.choices[0].message.content.strip()
@@ -1780,18 +4387,9 @@ def extract_resume_info_fallback(text):
                 break
         
         # Try to find university
-        university_patterns = [
-            r'University of ([^,\n]+)',
-            r'([^,\n]+ University)',
-            r'([^,\n]+ College)',
-            r'([^,\n]+ Institute)',
-        ]
-        
-        for pattern in university_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                result['university'] = match.group(1).strip()
-                break
+        university = segment_resume(text).university
+        if university:
+            result['university'] = university.strip()
         
         # Try to find year/class
         year_patterns = [
@@ -1856,14 +4454,14 @@ Extract and return JSON with:
 Keep each field concise - 1-2 words per item maximum.
 """
         
-        response = client.chat.completions.create(
+        response = coalesced_chat_completion(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "Extract key resume insights for networking. Return only valid JSON with concise entries."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=250,
-            temperature=0.3
+            temperature=0
         )
         
         response_text = response.choices[0].message.content.strip()
@@ -2807,7 +5405,7 @@ def validate_api_keys():
     """Validate that all required API keys are present"""
     missing_keys = []
     
-    if not PEOPLE_DATA_LABS_API_KEY or PEOPLE_DATA_LABS_API_KEY == 'your_pdl_api_key':
+    if not PEOPLE_DATA_LABS_API_KEYS or 'your_pdl_api_key' in PEOPLE_DATA_LABS_API_KEYS:
         missing_keys.append('PEOPLE_DATA_LABS_API_KEY')
     
     if not OPENAI_API_KEY or 'your_openai_api_key' in OPENAI_API_KEY:
@@ -2838,13 +5436,12 @@ def startup_checks():
     cleanup_old_csv_files()
     
     try:
-        test_response = requests.get(
-            f"{PDL_BASE_URL}/person/search",
+        test_response = pdl_client.get(
+            '/person/search',
             params={
-                'api_key': PEOPLE_DATA_LABS_API_KEY,
                 'query': '{"query":{"bool":{"must":[{"exists":{"field":"emails"}}]}},"size":1}'
             },
-            timeout=10
+            max_retries=0
         )
         if test_response.status_code in [200, 402]:
             print("PDL API connection: OK")
@@ -2893,6 +5490,47 @@ def health():
     })
 
 
+def rate_limited_response(error, **payload):
+    """429 with Retry-After for a request that ran out of PDL capacity"""
+    response = jsonify(dict(payload, error='Search capacity is temporarily exhausted, please retry shortly',
+                            retry_after=error.retry_after))
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+@app.route('/api/estimate', methods=['POST'])
+@require_firebase_auth
+def estimate_api():
+    """Predict how many contacts a search will return before running it"""
+    try:
+        data = request.get_json(silent=True) or {}
+        job_title = (data.get('jobTitle') or '').strip()
+        company = (data.get('company') or '').strip()
+        location = (data.get('location') or '').strip()
+        tier = data.get('tier') or 'pro'
+        
+        if not job_title or not location:
+            return jsonify({'error': 'Missing required fields: jobTitle and location'}), 400
+        if tier not in TIER_CONFIGS:
+            return jsonify({'error': f'Invalid tier. Must be one of: {", ".join(TIER_CONFIGS)}'}), 400
+        
+        exclusions = load_search_exclusions(request.firebase_user.get('email'))
+        return jsonify(estimate_contact_search(job_title, company, location, tier, exclusions=exclusions))
+    
+    except PDLRateLimitError as e:
+        return rate_limited_response(e)
+    except Exception as e:
+        print(f"Estimate endpoint error: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/cache/stats')
+@require_firebase_auth
+def cache_stats():
+    """PDL cache hit/miss counters (aggregated across worker processes) and this worker's per-key counters"""
+    return jsonify({'pdl_cache': pdl_cache.stats(), 'pdl_keys': pdl_key_pool.stats(), 'pdl_people': pdl_person_store.stats()})
+
+
 CREATE_GMAIL_DRAFTS = False  # Set True to create Gmail drafts; False to only return subject/body and compose links
 
 def build_mailto_link(contact, subject, body):
@@ -2906,15 +5544,46 @@ def build_mailto_link(contact, subject, body):
     except Exception:
         return ''
 
+# Concurrent email generations per tier run; each run gets its own pool, so a Pro run never queues ahead of a Free one
+EMAIL_GENERATION_WORKERS_PER_RUN = int(os.getenv('EMAIL_GENERATION_WORKERS_PER_RUN', '4'))
+
+def complete_pro_contact(contact, resume_text, user_profile=None):
+    """Pro extras for one contact: Similarity (if generator exists), Hometown and the email"""
+    try:
+        sim = generate_similarity_summary(resume_text, contact)
+    except Exception:
+        sim = ''
+    contact['Similarity'] = sim
+    # Try enhanced hometown via education history (if available)
+    edu_hist = contact.get('EducationTop') or contact.get('EducationHistory') or ''
+    try:
+        hometown = extract_hometown_from_education_history_enhanced(edu_hist)
+    except Exception:
+        hometown = contact.get('Hometown') or 'Unknown'
+    contact['Hometown'] = hometown or 'Unknown'
+    # Generate email
+    subj, body = generate_email_for_both_tiers(contact, resume_text=resume_text, user_profile=user_profile)
+    contact['email_subject'] = subj
+    contact['email_body'] = body
+    return contact
+
 # === NEW FINAL TIER FUNCTIONS (use unified email system) ===
 def run_free_tier_enhanced_final(job_title, company, location, user_email=None, user_profile=None, resume_text=None):
     """FREE: 8 contacts, identical email quality to PRO, basic fields."""
-    contacts = search_contacts_with_pdl_optimized(job_title, company, location, max_contacts=8)
-    if not contacts:
+    # Email generation starts on each contact as soon as its search page arrives
+    with ThreadPoolExecutor(max_workers=EMAIL_GENERATION_WORKERS_PER_RUN, thread_name_prefix='email-gen') as email_executor:
+        pending = [(contact, email_executor.submit(generate_email_for_both_tiers, contact,
+                                                   resume_text=resume_text, user_profile=user_profile))
+                   for contact in iter_contacts_with_smart_location_strategy(job_title, company, location, max_contacts=8,
+                                                                             fields=TIER_CONFIGS['free']['fields'],
+                                                                             exclusions=load_search_exclusions(user_email))]
+        emails = [email.result() for _, email in pending]
+    if not pending:
         return {'error': 'No contacts found', 'contacts': []}
+    contacts = []
     successful_drafts = 0
-    for contact in contacts:
-        subj, body = generate_email_for_both_tiers(contact, resume_text=resume_text, user_profile=user_profile)
+    for (contact, _), (subj, body) in zip(pending, emails):
+        contacts.append(contact)
         contact['email_subject'] = subj
         contact['email_body'] = body
         draft_id = create_gmail_draft_for_user(contact, subj, body, tier='free', user_email=user_email)
@@ -2922,12 +5591,7 @@ def run_free_tier_enhanced_final(job_title, company, location, user_email=None,
         if not str(draft_id).startswith('mock_'):
             successful_drafts += 1
     # Filter to Free fields only (including Hometown)
-    free_contacts = []
-    for c in contacts:
-        free_contact = {k: v for k, v in c.items() if k in TIER_CONFIGS['free']['fields']}
-        free_contact['email_subject'] = c.get('email_subject','')
-        free_contact['email_body'] = c.get('email_body','')
-        free_contacts.append(free_contact)
+    free_contacts = [ContactView(c, TIER_OUTPUT_KEYS['free'], TIER_OUTPUT_DEFAULTS) for c in contacts]
     # CSV
     csv_file = StringIO()
     fieldnames = TIER_CONFIGS['free']['fields'] + ['email_subject','email_body']
@@ -2945,27 +5609,15 @@ def run_pro_tier_enhanced_final(job_title, company, location, resume_file, user_
     resume_text = extract_text_from_pdf(resume_file)
     if not resume_text:
         return {'error': 'Could not extract text from PDF', 'contacts': []}
-    contacts = search_contacts_with_pdl_optimized(job_title, company, location, max_contacts=56)
+    # Each contact is enriched and emailed as soon as its search page arrives
+    with ThreadPoolExecutor(max_workers=EMAIL_GENERATION_WORKERS_PER_RUN, thread_name_prefix='email-gen') as email_executor:
+        pending = [email_executor.submit(complete_pro_contact, contact, resume_text, user_profile)
+                   for contact in iter_contacts_with_smart_location_strategy(job_title, company, location, max_contacts=56,
+                                                                             fields=TIER_CONFIGS['pro']['fields'],
+                                                                             exclusions=load_search_exclusions(user_email))]
+        contacts = [future.result() for future in pending]
     if not contacts:
         return {'error': 'No contacts found', 'contacts': []}
-    # Populate extra fields: Similarity (if generator exists) + Hometown
-    for contact in contacts:
-        try:
-            sim = generate_similarity_summary(resume_text, contact)
-        except Exception:
-            sim = ''
-        contact['Similarity'] = sim
-        # Try enhanced hometown via education history (if available)
-        edu_hist = contact.get('EducationTop') or contact.get('EducationHistory') or ''
-        try:
-            hometown = extract_hometown_from_education_history_enhanced(edu_hist)
-        except Exception:
-            hometown = contact.get('Hometown') or 'Unknown'
-        contact['Hometown'] = hometown or 'Unknown'
-        # Generate email
-        subj, body = generate_email_for_both_tiers(contact, resume_text=resume_text, user_profile=user_profile)
-        contact['email_subject'] = subj
-        contact['email_body'] = body
     # Create drafts
     successful_drafts = 0
     for contact in contacts:
@@ -2974,12 +5626,7 @@ def run_pro_tier_enhanced_final(job_title, company, location, resume_file, user_
         if not str(draft_id).startswith('mock_'):
             successful_drafts += 1
     # Filter to Pro fields
-    pro_contacts = []
-    for c in contacts:
-        pro_contact = {k: v for k, v in c.items() if k in TIER_CONFIGS['pro']['fields']}
-        pro_contact['email_subject'] = c.get('email_subject','')
-        pro_contact['email_body'] = c.get('email_body','')
-        pro_contacts.append(pro_contact)
+    pro_contacts = [ContactView(c, TIER_OUTPUT_KEYS['pro'], TIER_OUTPUT_DEFAULTS) for c in contacts]
     # CSV
     csv_file = StringIO()
     fieldnames = TIER_CONFIGS['pro']['fields'] + ['email_subject','email_body']
@@ -3101,6 +5748,7 @@ def free_run():
         
         if result.get('error'):
             return jsonify({'error': result['error']}), 500
+        record_seen_people_after_delivery(user_email, result['contacts'])
         
         # CHECK FOR JSON FORMAT REQUEST
         want_json = request.args.get('format') == 'json' or 'application/json' in (request.headers.get('Accept', ''))
@@ -3146,6 +5794,9 @@ def free_run():
 
         return send_file(result['csv_file'], as_attachment=True)
         
+    except PDLRateLimitError as e:
+        print(f"Free endpoint rate limited: {e}")
+        return rate_limited_response(e)
     except Exception as e:
         print(f"Free endpoint error: {e}")
         traceback.print_exc()
@@ -3211,6 +5862,7 @@ def pro_run():
         
         if result.get('error'):
             return jsonify({'error': result['error']}), 500
+        record_seen_people_after_delivery(user_email, result['contacts'])
         
         # CHECK FOR JSON FORMAT REQUEST
         want_json = request.args.get('format') == 'json' or 'application/json' in (request.headers.get('Accept', ''))
@@ -3256,6 +5908,9 @@ def pro_run():
 
         return send_file(result['csv_file'], as_attachment=True)
         
+    except PDLRateLimitError as e:
+        print(f"Pro endpoint rate limited: {e}")
+        return rate_limited_response(e)
     except Exception as e:
         print(f"Pro endpoint exception: {e}")
         traceback.print_exc()
@@ -3313,6 +5968,8 @@ def autocomplete_api(data_type):
             'count': len(clean_suggestions)
         })
         
+    except PDLRateLimitError as e:
+        return rate_limited_response(e, suggestions=[], query=query, data_type=data_type)
     except Exception as e:
         print(f"Autocomplete API error for {data_type} - '{query}': {e}")
         traceback.print_exc()
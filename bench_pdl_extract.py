@@ -0,0 +1,339 @@
+"""Micro-benchmark for PDL person -> contact extraction
+
+Builds a batch of synthetic PDL person records shaped like /person/search results and
+reports contacts/sec for the full contact and for each tier's field set.
+
+    python bench_pdl_extract.py [people] [rounds]
+    python bench_pdl_extract.py --check [people]
+
+--check instead compares the compiled extractor with the pre-spec extractor on clean and
+malformed records for every tier's field set and random field subsets, and exits non-zero
+on any difference (including which records are rejected).
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('PEOPLE_DATA_LABS_API_KEY', 'bench')
+os.environ.setdefault('OPENAI_API_KEY', 'bench')
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+
+COMPANIES = ['Goldman Sachs', 'Google', 'McKinsey & Company', 'Stripe', 'JPMorgan Chase']
+TITLES = ['Software Engineer', 'Investment Banking Analyst', 'Product Manager', 'Associate', 'Data Scientist']
+SCHOOLS = ['University of Michigan', 'Stanford University', 'Lincoln High School', 'New York University']
+INTERESTS = ['golf', 'volunteering', 'chess', 'community outreach', 'running', 'photography', 'mentoring']
+SUMMARIES = [
+    'Engineer focused on payments infrastructure. I volunteer with Code.org and mentor new grads. Avid runner.',
+    'Banker covering technology clients. Board member at a local nonprofit.',
+    'Product leader. Previously founded a startup.',
+    '',
+]
+
+def make_person(rng, i):
+    experience = []
+    year = 2024
+    for j in range(rng.randint(1, 6)):
+        start = year - rng.randint(1, 4)
+        experience.append({
+            'company': {'name': rng.choice(COMPANIES)},
+            'title': {'name': rng.choice(TITLES)},
+            'start_date': {'year': start, 'month': rng.choice([None, 1, 6, 9])},
+            'end_date': None if j == 0 else {'year': year, 'month': rng.choice([None, 5, 12])},
+        })
+        year = start
+    education = [{
+        'school': {'name': school},
+        'degrees': rng.choice([['bachelors'], ['masters'], []]),
+        'start_date': {'year': 2010 + k * 4},
+        'end_date': {'year': 2014 + k * 4},
+    } for k, school in enumerate(rng.sample(SCHOOLS, rng.randint(1, 3)))]
+    return {
+        'id': f'bench{i}',
+        'first_name': 'Jordan',
+        'last_name': f'Lee{i}',
+        'experience': experience,
+        'education': education,
+        'location': {'locality': 'new york', 'region': 'new york'},
+        'emails': [{'address': f'jlee{i}@example.com', 'type': 'personal'}, {'address': f'jlee{i}@work.com', 'type': 'work'}],
+        'recommended_personal_email': f'jlee{i}@example.com' if rng.random() < 0.6 else None,
+        'phone_numbers': ['+15555550100'] if rng.random() < 0.4 else [],
+        'profiles': [{'network': 'twitter', 'url': 'twitter.com/jlee'}, {'network': 'linkedin', 'url': f'linkedin.com/in/jlee{i}'}],
+        'interests': rng.sample(INTERESTS, rng.randint(0, 5)),
+        'summary': rng.choice(SUMMARIES),
+        'linkedin_connections': rng.randint(50, 500),
+        'dataset_version': '31.0',
+    }
+
+def reference_extract_contact(person, fields=None):
+    """The extractor as it was before PDL_CONTACT_FIELD_SPEC, kept verbatim as the parity reference"""
+    try:
+        want = set(fields).__contains__ if fields else (lambda field: True)
+        
+        # Basic info
+        first_name = person.get('first_name', '')
+        last_name = person.get('last_name', '')
+        
+        if not first_name or not last_name:
+            return None
+        
+        # Get detailed work experience from experience array
+        experience = person.get('experience', [])
+        work_experience_details = []
+        current_job = None
+        
+        if isinstance(experience, list) and experience:
+            # Current job (first in array)
+            current_job = experience[0]
+            
+            # Build detailed work experience
+            for i, job in enumerate(experience[:5] if want('WorkSummary') else []):  # Top 5 experiences
+                if isinstance(job, dict):
+                    company_info = job.get('company', {})
+                    title_info = job.get('title', {})
+                    
+                    company_name = company_info.get('name', '') if isinstance(company_info, dict) else ''
+                    job_title = title_info.get('name', '') if isinstance(title_info, dict) else ''
+                    
+                    start_date = job.get('start_date', {})
+                    end_date = job.get('end_date', {})
+                    
+                    # Format dates
+                    start_str = ""
+                    end_str = ""
+                    if isinstance(start_date, dict):
+                        start_year = start_date.get('year')
+                        start_month = start_date.get('month')
+                        if start_year:
+                            start_str = f"{start_month or 1}/{start_year}" if start_month else str(start_year)
+                    
+                    if isinstance(end_date, dict):
+                        end_year = end_date.get('year')
+                        end_month = end_date.get('month')
+                        if end_year:
+                            end_str = f"{end_month or 12}/{end_year}" if end_month else str(end_year)
+                    elif i == 0:  # Current job
+                        end_str = "Present"
+                    
+                    # Build experience entry
+                    if company_name and job_title:
+                        duration = f"{start_str} - {end_str}" if start_str else "Date unknown"
+                        work_experience_details.append(f"{job_title} at {company_name} ({duration})")
+        
+        # Extract current job details
+        company_name = ''
+        job_title = ''
+        if current_job:
+            company_info = current_job.get('company', {})
+            title_info = current_job.get('title', {})
+            company_name = company_info.get('name', '') if isinstance(company_info, dict) else ''
+            job_title = title_info.get('name', '') if isinstance(title_info, dict) else ''
+        
+        # Get location using correct field structure
+        location_info = person.get('location')
+        if isinstance(location_info, dict):
+            city = location_info.get('locality', '')
+            state = location_info.get('region', '')
+        else:
+            city = person.get('location_locality') or ''
+            state = person.get('location_region') or ''
+        
+        # Enhanced email extraction
+        primary_email = person.get('recommended_personal_email', '')
+        emails = person.get('emails', [])
+        personal_email = ''
+        work_email = ''
+        
+        if isinstance(emails, list) and emails:
+            for email in emails:
+                if isinstance(email, dict):
+                    email_address = email.get('address', '')
+                    email_type = email.get('type', '')
+                    
+                    if email_type == 'work':
+                        work_email = email_address
+                    elif email_type == 'personal':
+                        personal_email = email_address
+        
+        if not primary_email:
+            primary_email = personal_email or work_email
+        
+        # Get phone
+        phone_numbers = person.get('phone_numbers', []) if want('Phone') else []
+        phone = phone_numbers[0] if isinstance(phone_numbers, list) and phone_numbers else ''
+        
+        # Get LinkedIn
+        profiles = person.get('profiles', []) if want('LinkedIn') or want('SocialProfiles') else []
+        linkedin_url = ''
+        
+        if isinstance(profiles, list):
+            for profile in profiles:
+                if isinstance(profile, dict) and 'linkedin' in profile.get('network', '').lower():
+                    linkedin_url = profile.get('url', '')
+                    break
+        
+        # Enhanced education extraction with detailed history
+        education = person.get('education', []) if want('College') or want('EducationTop') else []
+        education_details = []
+        college_name = ""
+        
+        if isinstance(education, list):
+            for edu in education:
+                if college_name and not want('EducationTop'):
+                    break
+                if isinstance(edu, dict):
+                    school_info = edu.get('school', {})
+                    if isinstance(school_info, dict):
+                        school_name = school_info.get('name', '')
+                        degrees = edu.get('degrees', [])
+                        degree = degrees[0] if isinstance(degrees, list) and degrees else ''
+                        
+                        # Get education dates
+                        start_date = edu.get('start_date', {})
+                        end_date = edu.get('end_date', {})
+                        
+                        start_year = start_date.get('year') if isinstance(start_date, dict) else None
+                        end_year = end_date.get('year') if isinstance(end_date, dict) else None
+                        
+                        if school_name:
+                            # Build education entry
+                            edu_entry = school_name
+                            if degree:
+                                edu_entry += f" - {degree}"
+                            if start_year or end_year:
+                                years = f"({start_year or '?'} - {end_year or 'Present'})"
+                                edu_entry += f" {years}"
+                            
+                            education_details.append(edu_entry)
+                            
+                            # Set college name (usually the first/most recent)
+                            if not college_name and 'high school' not in school_name.lower():
+                                college_name = school_name
+        
+        education_history = '; '.join(education_details) if education_details else 'Not available'
+        
+        # Enhanced volunteer work extraction from interests and other sources
+        volunteer_work = []
+        
+        # From interests (enhanced extraction)
+        interests = person.get('interests', []) if want('VolunteerHistory') else []
+        if isinstance(interests, list) and interests:
+            for interest in interests:
+                if isinstance(interest, str):
+                    # Look for volunteer-related keywords
+                    if any(word in interest.lower() for word in ['volunteer', 'charity', 'nonprofit', 'community', 'outreach', 'mentor']):
+                        volunteer_work.append(interest)
+                    elif len(volunteer_work) < 3:  # Add general interests as potential volunteer areas
+                        volunteer_work.append(f"{interest} enthusiast")
+        
+        # From summary or bio if available
+        summary = person.get('summary', '') if want('VolunteerHistory') else ''
+        if summary and isinstance(summary, str):
+            # Look for volunteer mentions in summary
+            volunteer_keywords = ['volunteer', 'charity', 'nonprofit', 'community service', 'mentor', 'coach']
+            summary_lower = summary.lower()
+            for keyword in volunteer_keywords:
+                if keyword in summary_lower:
+                    # Try to extract context around the keyword
+                    sentences = summary.split('.')
+                    for sentence in sentences:
+                        if keyword in sentence.lower():
+                            volunteer_work.append(sentence.strip())
+                            break
+        
+        volunteer_history = '; '.join(volunteer_work[:5]) if volunteer_work else 'Not available'  # Limit to 5 entries
+        
+        # Build enhanced contact object
+        contact_values = {
+            'FirstName': first_name,
+            'LastName': last_name,
+            'LinkedIn': linkedin_url,
+            'Email': primary_email,
+            'Title': job_title,
+            'Company': company_name,
+            'City': city,
+            'State': state,
+            'College': college_name,
+            'Phone': phone,
+            'PersonalEmail': person.get('recommended_personal_email', personal_email),
+            'WorkEmail': work_email or 'Not available',
+            'SocialProfiles': f'LinkedIn: {linkedin_url}' if linkedin_url else 'Not available',
+            'EducationTop': education_history,  # Now contains full education history
+            'VolunteerHistory': volunteer_history,  # Enhanced volunteer work
+            'WorkSummary': '; '.join(work_experience_details[:3]) if work_experience_details else f"Professional at {company_name}",  # Detailed work experience
+            'Group': f"{company_name} {job_title.split()[0] if job_title else 'Professional'} Team",
+            'LinkedInConnections': person.get('linkedin_connections', 0),
+            'DataVersion': person.get('dataset_version', 'Unknown')
+        }
+        
+        if fields:
+            return {k: v for k, v in contact_values.items() if k in ('FirstName', 'LastName') or want(k)}
+        return contact_values
+        
+    except Exception:
+        return None
+
+# Malformed values PDL records have been seen with; each is swapped into a random person
+CORRUPTIONS = [
+    lambda p, rng: p.setdefault('education', []).append({'school': {'name': 5}}),
+    lambda p, rng: p.setdefault('education', []).insert(0, {'school': 'Harvard'}),
+    lambda p, rng: p.setdefault('experience', []).append('junk'),
+    lambda p, rng: p.setdefault('experience', []).insert(0, 'junk'),
+    lambda p, rng: p.setdefault('experience', []).insert(0, {'title': {'name': ' '}}),
+    lambda p, rng: p.setdefault('profiles', []).insert(0, {'network': None}),
+    lambda p, rng: p.update(emails=['s', {'address': 'x@y.com', 'type': None}]),
+    lambda p, rng: p.setdefault('interests', []).append(5),
+    lambda p, rng: p.update(summary=None, location=None),
+    lambda p, rng: p.update(first_name=''),
+    lambda p, rng: p.pop(rng.choice(['experience', 'education', 'profiles', 'emails', 'dataset_version']), None),
+]
+
+def check_parity(count):
+    rng = random.Random(7)
+    fields_sets = [None] + [config['fields'] for config in app.TIER_CONFIGS.values()]
+    contact_fields = [field for field in app.CONTACT_FIELDS if field in app.CONTACT_FIELD_PDL_SOURCES or field in ('FirstName', 'LastName')]
+    mismatches = 0
+    for i in range(count):
+        person = make_person(rng, i)
+        for corrupt in rng.sample(CORRUPTIONS, rng.randint(0, 3)):
+            corrupt(person, rng)
+        for fields in fields_sets + [rng.sample(contact_fields, rng.randint(1, 6))]:
+            expected = reference_extract_contact(person, fields)
+            with contextlib.redirect_stdout(io.StringIO()):
+                contact = app.extract_contact_from_pdl_person_enhanced(person, fields)
+            actual = None if contact is None else [(k, v) for k, v in contact.items() if k != 'PdlId']
+            if actual != (None if expected is None else list(expected.items())):
+                mismatches += 1
+                if mismatches <= 3:
+                    print(f"  mismatch for fields={fields}: {person}")
+    print(f"PDL contact extraction parity, {count} people: {mismatches} mismatches")
+    return mismatches == 0
+
+def bench(people, fields, rounds):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for person in people:
+            app.extract_contact_from_pdl_person_enhanced(person, fields)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(people) / best
+
+def main():
+    if sys.argv[1:2] == ['--check']:
+        sys.exit(0 if check_parity(int(sys.argv[2]) if len(sys.argv) > 2 else 5000) else 1)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    rng = random.Random(42)
+    people = [make_person(rng, i) for i in range(count)]
+
+    print(f"PDL contact extraction, {count} people, best of {rounds}")
+    for label, fields in [('all fields', None)] + [(f'{tier} tier', config['fields']) for tier, config in app.TIER_CONFIGS.items()]:
+        print(f"  {label:<12} {bench(people, fields, rounds):>12,.0f} contacts/sec")
+
+if __name__ == '__main__':
+    main()